@@ -108,8 +108,7 @@ class ArxivTranslatorWebUI:
     def get_cache_key(self, arxiv_input: str, user_requirements: str, user_terms: str) -> str:
         """生成缓存键"""
         # 解析arxiv ID
-        downloader = ArxivDownloader()
-        success, arxiv_id, _ = downloader.parse_arxiv_input(arxiv_input)
+        success, arxiv_id, _ = ArxivDownloader.parse_arxiv_input(arxiv_input)
         
         if not success:
             # 如果解析失败，使用原始输入
@@ -199,8 +198,7 @@ class ArxivTranslatorWebUI:
             
             # 解析arxiv_id以确定目录结构
             from step1_arxiv_downloader import ArxivDownloader
-            downloader = ArxivDownloader()
-            success_parse, arxiv_id, _ = downloader.parse_arxiv_input(arxiv_input)
+            success_parse, arxiv_id, _ = ArxivDownloader.parse_arxiv_input(arxiv_input)
             
             if not success_parse:
                 return "❌ 无法解析arxiv输入", None, "输入格式错误"
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LaTeX编译Worker - 从Redis任务队列消费异步编译任务
+
+主要功能：
+1. 从Redis队列中领取异步编译任务（领取时移入处理中列表，完成后才删除）
+2. 执行LaTeX编译并把任务状态写回Redis
+3. 定期把崩溃的worker遗留在处理中列表的任务放回队列
+4. 可以启动多个worker进程，与HTTP服务分开横向扩展
+
+输入：Redis队列中的编译任务（msgpack编码）
+输出：Redis中的任务状态和编译结果
+
+使用方法：
+    LATEX_REDIS_URL=redis://localhost:6379/0 python3 latex_compile_worker.py
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from latex_compile_server import (
+    LaTeXCompiler,
+    CompileResponse,
+    REDIS_JOB_QUEUE,
+    REDIS_PROCESSING_QUEUE,
+    redis_client,
+    msgpack,
+    load_task_status,
+    save_task_status,
+    init_workdir_pool,
+    remove_workdir_pool,
+)
+
+logger = logging.getLogger(__name__)
+
+# 处理中的任务超过该时间没有状态更新，视为所属worker已崩溃（单次编译最长约10分钟）
+STALE_JOB_AGE = timedelta(minutes=15)
+
+# 检查遗留任务的间隔；重启后的worker领取新任务时，自己崩溃前的任务也会在过期后被放回队列
+REAP_INTERVAL = timedelta(minutes=1)
+
+
+def update_task(task_id: str, **fields):
+    """
+    更新Redis中的任务状态
+
+    输入：
+    - task_id: 任务ID，如 "task_12345"
+    - fields: 需要更新的字段，如 status="running", progress=10.0
+
+    输出：无
+
+    这个函数读取任务状态、修改字段并刷新更新时间后写回Redis
+    """
+    task_status = load_task_status(task_id)
+    if task_status is None:
+        logger.warning(f"任务不存在或已过期: {task_id}")
+        return
+
+    for name, value in fields.items():
+        setattr(task_status, name, value)
+    task_status.updated_at = datetime.now()
+    save_task_status(task_status)
+
+
+def run_job(job: dict):
+    """
+    执行单个编译任务
+
+    输入：
+    - job: 任务字典，包含 task_id、tex_content、output_name、dependencies、verbose
+
+    输出：无（结果写回Redis）
+    """
+    task_id = job["task_id"]
+
+    try:
+        update_task(task_id, status="running", progress=10.0)
+
+        compiler = LaTeXCompiler()
+        result = compiler.compile_latex(
+            job["tex_content"],
+            job["output_name"],
+            job.get("dependencies"),
+            job.get("verbose", False)
+        )
+
+        if result.success:
+            update_task(task_id, status="completed", progress=100.0, result=result)
+        else:
+            update_task(task_id, status="failed", progress=90.0, result=result)
+
+        logger.info(f"异步编译任务完成: {task_id}, 成功: {result.success}")
+
+    except Exception as e:
+        error_msg = f"异步编译任务异常: {e}"
+        logger.error(f"任务 {task_id} 异常: {error_msg}")
+        update_task(task_id, status="failed", result=CompileResponse(
+            success=False,
+            error=error_msg,
+            log=""
+        ))
+
+
+def requeue_stale_jobs() -> int:
+    """
+    把崩溃的worker遗留的任务放回队列
+
+    输入：无
+
+    输出：
+    - requeued: 放回队列的任务数量
+
+    这个函数检查处理中列表：任务状态已过期或已结束的直接移除；长时间没有更新的
+    放回队列头部重新执行，其他worker正在执行的任务不会被误放回
+    """
+    requeued = 0
+    now = datetime.now()
+    for payload in redis_client.lrange(REDIS_PROCESSING_QUEUE, 0, -1):
+        try:
+            task_id = msgpack.unpackb(payload)["task_id"]
+            task_status = load_task_status(task_id)
+        except Exception as e:
+            logger.error(f"解析处理中任务失败: {e}")
+            task_id, task_status = None, None
+
+        if task_status is None or task_status.status in ("completed", "failed"):
+            redis_client.lrem(REDIS_PROCESSING_QUEUE, 1, payload)
+            continue
+
+        if now - task_status.updated_at < STALE_JOB_AGE:
+            continue
+
+        # LREM是原子操作，多个worker同时启动时只有一个能移出该任务
+        if redis_client.lrem(REDIS_PROCESSING_QUEUE, 1, payload):
+            update_task(task_id, status="pending", progress=0.0)
+            redis_client.lpush(REDIS_JOB_QUEUE, payload)
+            requeued += 1
+            logger.warning(f"重新排队崩溃worker遗留的任务: {task_id}")
+    return requeued
+
+
+def main():
+    """
+    主函数，循环领取并执行编译任务
+    """
+    if redis_client is None:
+        print("✗ 未配置Redis，请设置LATEX_REDIS_URL并安装redis、msgpack")
+        return
+
+    print("=" * 70)
+    print(f"启动LaTeX编译Worker，监听队列: {REDIS_JOB_QUEUE}")
+    print("=" * 70)
+
+    init_workdir_pool()
+    last_reap = None
+    try:
+        while True:
+            # 启动时和之后每隔REAP_INTERVAL检查一次处理中列表，不依赖其他worker重启
+            if last_reap is None or datetime.now() - last_reap >= REAP_INTERVAL:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    print(f"已重新排队 {requeued} 个遗留任务")
+                last_reap = datetime.now()
+
+            # 队列为rpush写入，从左侧取出保证先进先出；取出的同时移入处理中列表，
+            # worker在编译中途崩溃时任务不会丢失
+            payload = redis_client.blmove(REDIS_JOB_QUEUE, REDIS_PROCESSING_QUEUE, 5, "LEFT", "RIGHT")
+            if payload is None:
+                continue
+
+            try:
+                job = msgpack.unpackb(payload)
+            except Exception as e:
+                logger.error(f"解析任务失败: {e}")
+                redis_client.lrem(REDIS_PROCESSING_QUEUE, 1, payload)
+                continue
+
+            run_job(job)
+            # 任务状态已写回Redis，从处理中列表移除
+            redis_client.lrem(REDIS_PROCESSING_QUEUE, 1, payload)
+    except KeyboardInterrupt:
+        print("\nWorker已停止")
+    finally:
+        remove_workdir_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,17 +18,47 @@ Arxiv论文下载器 (优化版)
 
 import os
 import re
+import asyncio
+import functools
 import time
 import random
 import requests
+from requests.adapters import HTTPAdapter
 import tarfile
 import shutil
 import hashlib
+import json
+import queue
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import logging
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Dict
+from collections import defaultdict
 from urllib.parse import urlparse
-from fake_useragent import UserAgent
+from email.utils import parsedate_to_datetime
+
+try:
+    from fake_useragent import UserAgent
+except ImportError:
+    UserAgent = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import libarchive
+except ImportError:
+    libarchive = None
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
 
 # 配置日志
 logging.basicConfig(
@@ -37,6 +67,620 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 下载时的拷贝缓冲区大小（1MB），减少write系统调用次数
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+# 镜像源返回403/429后暂停使用的时间（秒），响应带Retry-After时以它为准
+MIRROR_COOLDOWN_SECONDS = 60
+# Retry-After最多等待的时间（秒），防止服务器要求等待过久导致程序卡住
+MAX_RETRY_AFTER_SECONDS = 300
+
+# 所有镜像源都返回404时的错误信息：论文不存在，不必再换一种方式重试
+NOT_FOUND_ERROR = "所有镜像源都返回404，论文不存在"
+
+# 解压完成后写入解压目录的标记文件；没有这个文件的解压目录视为中断的解压
+EXTRACT_DONE_MARKER = ".extract_done"
+
+# 每个镜像主机的请求速率上限（次/秒）和允许的突发请求数，arxiv公开要求不超过每秒4次
+MIRROR_REQUESTS_PER_SECOND = 4
+MIRROR_REQUEST_BURST = 8
+_host_buckets = {}
+
+# 镜像源成功率和响应时间的指数加权平均系数，越大越看重最近的结果
+MIRROR_SCORE_ALPHA = 0.3
+# 排在最前的镜像源成功率不低于这个值时直接使用，不再并发探测各镜像源
+MIRROR_HEALTHY_RATE = 0.9
+
+# 批量并发下载时每个镜像主机同时进行的下载数上限，避免对arxiv造成过大压力
+MAX_DOWNLOADS_PER_HOST = 3
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+# 流式解压时网络读取线程和解压线程之间最多缓存的数据块数（每块1MB）
+PIPELINE_QUEUE_SIZE = 8
+
+# 超过这个大小且服务器支持Range时，分成多段并发下载
+RANGE_DOWNLOAD_THRESHOLD = 4 * 1024 * 1024
+RANGE_DOWNLOAD_PARTS = 4
+
+# 从fake_useragent抽样的User-Agent数量：第一次发请求时抽样一次，所有下载器实例共享
+UA_POOL_SIZE = 16
+_ua_pool = None
+_ua_pool_lock = threading.Lock()
+
+# 读取tar包和tarfile内部逐文件拷贝的缓冲区大小（默认只有8KB/16KB）
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+
+# 写入缓存索引的下载器版本，缓存格式变化时递增
+DOWNLOADER_VERSION = "1.1"
+
+
+class _CountMinSketch:
+    """
+    TinyLFU使用的Count-Min Sketch频率估计器
+    
+    4行×1024列的16位计数器，占用8KB；累计次数达到采样窗口后所有计数减半，
+    让频率随时间衰减，旧的热门论文不会永远占着缓存
+    """
+    
+    def __init__(self, depth: int = 4, width: int = 1024, sample_size: int = 10240):
+        self.depth = depth
+        self.width = width
+        self.sample_size = sample_size
+        self.additions = 0
+        self.rows = [array('H', bytes(2 * width)) for _ in range(depth)]
+        self._lock = threading.Lock()
+    
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[i * 4:(i + 1) * 4], 'little') % self.width
+                for i in range(self.depth)]
+    
+    def increment(self, key: str):
+        with self._lock:
+            for row, idx in zip(self.rows, self._indexes(key)):
+                if row[idx] < 0xFFFF:
+                    row[idx] += 1
+            
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self.rows = [array('H', (count >> 1 for count in row)) for row in self.rows]
+                self.additions //= 2
+    
+    def estimate(self, key: str) -> int:
+        with self._lock:
+            return min(row[idx] for row, idx in zip(self.rows, self._indexes(key)))
+
+
+# 进程内共享的访问频率统计，多个下载器实例共用
+_frequency_sketch = _CountMinSketch()
+
+class _HashingWriter:
+    """
+    写入文件的同时更新哈希并累计写入的字节数
+    
+    下载时顺带计算sha256，不需要写完后再把文件读一遍；
+    进度线程直接读取written，不用和写入线程争用文件对象的锁去调用tell()
+    """
+    
+    def __init__(self, f, hasher):
+        self._f = f
+        self._hasher = hasher
+        self.written = 0
+    
+    def write(self, data) -> int:
+        self._hasher.update(data)
+        self.written += len(data)
+        return self._f.write(data)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析Retry-After响应头
+    
+    输入：
+    - value: 响应头的值，秒数（如 "120"）或HTTP日期（如 "Wed, 21 Oct 2015 07:28:00 GMT"）
+    
+    输出：
+    - seconds: 需要等待的秒数（不超过 MAX_RETRY_AFTER_SECONDS），没有或无法解析时返回None
+    """
+    if not value:
+        return None
+    
+    value = value.strip()
+    try:
+        if value.isdigit():
+            seconds = float(value)
+        else:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+class _TokenBucket:
+    """
+    令牌桶限速器，跨线程共享
+    
+    每个请求先预约一个令牌，令牌不足时返回需要等待的时间，
+    同步代码用time.sleep、异步代码用asyncio.sleep等待，限速逻辑只有一份
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self) -> float:
+        """
+        预约一个令牌
+        
+        输出：
+        - delay: 发出请求前需要等待的秒数，令牌充足时为0
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+    
+    def try_reserve(self) -> bool:
+        """
+        令牌充足时取走一个令牌，不足时不等待也不透支
+        
+        输出：
+        - reserved: 是否取到令牌
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def _host_bucket(url: str) -> _TokenBucket:
+    """
+    获取镜像主机对应的令牌桶，跨线程、跨下载器实例共享
+    
+    输入：
+    - url: 请求地址，如 "https://export.arxiv.org/e-print/1812.10695"
+    
+    输出：
+    - bucket: 该主机的令牌桶
+    """
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = _TokenBucket(MIRROR_REQUESTS_PER_SECOND, MIRROR_REQUEST_BURST)
+            _host_buckets[host] = bucket
+    return bucket
+
+
+def _wait_for_token(url: str):
+    """
+    按主机限速，令牌不足时阻塞等待
+    
+    输入：
+    - url: 请求地址
+    """
+    delay = _host_bucket(url).reserve()
+    if delay > 0:
+        logger.debug("请求速率受限，等待 %.2f 秒: %s", delay, url)
+        time.sleep(delay)
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """
+    获取镜像主机对应的信号量，限制对同一主机的并发下载数
+    
+    输入：
+    - url: 下载地址，如 "https://arxiv.org/e-print/1812.10695"
+    
+    输出：
+    - semaphore: 该主机共享的信号量，跨线程、跨下载器实例生效
+    """
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_DOWNLOADS_PER_HOST)
+            _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def _pump_stream(raw, chunks: queue.Queue, hasher, stop_event: threading.Event):
+    """
+    生产者线程：从网络读取数据块放入队列，同时计算sha256
+    
+    输入：
+    - raw: HTTP响应的原始流
+    - chunks: 有界队列，放入bytes数据块，结束时放入None，出错时放入异常
+    - hasher: hashlib的sha256对象
+    - stop_event: 消费者提前退出时设置，生产者随之停止
+    """
+    def put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                chunks.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    try:
+        while True:
+            chunk = raw.read(DOWNLOAD_BUFFER_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if not put(chunk):
+                return
+        put(None)
+    except Exception as e:
+        put(e)
+
+
+class _QueueReader:
+    """
+    把生产者线程放入队列的数据块包装成可读文件对象，供tarfile流式读取
+    """
+    
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self._eof = False
+    
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            item = self._chunks.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                self._buffer += item
+        
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+
+class _ExtractTarFile(tarfile.TarFile):
+    """
+    解压缓存用的TarFile
+    
+    不恢复属主、权限和时间戳，省掉每个文件的chown/chmod/utime系统调用；
+    写出失败的成员记录日志，配合 errorlevel=0 由extractall跳过
+    """
+    
+    def chown(self, tarinfo, targetpath, numeric_owner):
+        pass
+    
+    def chmod(self, tarinfo, targetpath):
+        pass
+    
+    def utime(self, tarinfo, targetpath):
+        pass
+    
+    def makefile(self, tarinfo, targetpath):
+        try:
+            super().makefile(tarinfo, targetpath)
+        except OSError as e:
+            logger.warning("跳过解压文件 %s: %s", tarinfo.name, e)
+            raise
+
+
+def _logging_data_filter(member: tarfile.TarInfo, dest_path: str) -> Optional[tarfile.TarInfo]:
+    """
+    tarfile的 'data' 解压过滤器，不通过的成员记录日志后跳过，而不是中断整个解压
+    
+    输入：
+    - member: tar包中的成员信息
+    - dest_path: 解压目录路径
+    
+    输出：
+    - member: 过滤后的成员信息，需要跳过时返回None
+    """
+    try:
+        return tarfile.data_filter(member, dest_path)
+    except tarfile.FilterError as e:
+        logger.warning("跳过解压文件 %s: %s", member.name, e)
+        return None
+
+
+class _SendfileTarFile(_ExtractTarFile):
+    """
+    成员数据用os.sendfile拷贝的TarFile
+    
+    只适用于未压缩、以真实文件打开的tar包；拷贝在内核中完成，不经过用户态缓冲区。
+    稀疏文件或sendfile不可用时退回到tarfile自带的实现
+    """
+    
+    def makefile(self, tarinfo, targetpath):
+        if tarinfo.sparse is not None:
+            return super().makefile(tarinfo, targetpath)
+        
+        try:
+            src_fd = self.fileobj.fileno()
+            offset = tarinfo.offset_data
+            remaining = tarinfo.size
+            with open(targetpath, 'wb') as target:
+                dst_fd = target.fileno()
+                while remaining > 0:
+                    sent = os.sendfile(dst_fd, src_fd, offset, remaining)
+                    if sent == 0:
+                        raise tarfile.ReadError("unexpected end of data")
+                    offset += sent
+                    remaining -= sent
+        except (AttributeError, OSError):
+            # 平台不支持文件到文件的sendfile（如macOS），重新按普通方式写出
+            return super().makefile(tarinfo, targetpath)
+        
+        # sendfile不移动文件位置，这里对齐到成员数据末尾
+        self.fileobj.seek(tarinfo.offset_data + tarinfo.size)
+
+
+def _is_compressed(f) -> bool:
+    """
+    根据文件头判断tar包是否经过gzip/bzip2/xz压缩
+    
+    输入：
+    - f: 以 'rb' 打开的BufferedReader，读取位置不会改变
+    
+    输出：
+    - is_compressed: 是否为压缩格式（布尔值）
+    """
+    head = f.peek(6)[:6]
+    return head.startswith((b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00'))
+
+
+def _file_sha256(path) -> str:
+    """
+    顺序读取文件计算sha256
+    
+    输入：
+    - path: 文件路径
+    
+    输出：
+    - tar_sha256: 十六进制摘要
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'rb', buffering=0) as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BUFFER_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _user_agent_pool(fallback: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    获取User-Agent池
+    
+    输入：
+    - fallback: fake_useragent不可用时使用的预设User-Agent列表
+    
+    输出：
+    - pool: User-Agent元组
+    
+    ua.random每次调用约6毫秒，放到第一次请求时抽样，创建下载器实例（如只为解析输入）不付出这部分开销
+    """
+    global _ua_pool
+    if _ua_pool is None:
+        with _ua_pool_lock:
+            if _ua_pool is None:
+                pool = ()
+                if UserAgent is not None:
+                    try:
+                        ua = UserAgent()
+                        pool = tuple({ua.random for _ in range(UA_POOL_SIZE)})
+                    except Exception as e:
+                        logger.debug("fake_useragent初始化失败，使用预设User-Agent: %s", e)
+                _ua_pool = pool or tuple(fallback)
+    return _ua_pool
+
+
+def _part_path(tar_path: Path) -> Path:
+    """
+    下载中的临时文件路径
+    
+    输入：
+    - tar_path: tar文件路径，如 Path("cache/1812.10695/e-print/1812.10695.tar")
+    
+    输出：
+    - part_path: 同目录下的临时文件路径，如 Path(".../1812.10695.tar.part")
+    
+    tar文件可能是 blobs/ 中共享tar包的硬链接，不能原地截断重写，否则会改坏共享的内容；
+    先写临时文件再用os.replace替换，只改变tar_path这一个目录项
+    """
+    return tar_path.with_name(tar_path.name + ".part")
+
+
+def _write_extract_marker(extract_root, tar_sha256: Optional[str]):
+    """
+    解压成功后在解压目录写入完成标记，内容为tar包的sha256（未知时为空）
+    
+    输入：
+    - extract_root: 解压目录，如 "./arxiv_cache/1812.10695/extract"
+    - tar_sha256: tar包的sha256
+    """
+    with open(os.path.join(extract_root, EXTRACT_DONE_MARKER), 'w', encoding='ascii') as f:
+        f.write(tar_sha256 or "")
+
+
+def _read_extract_marker(extract_root) -> Optional[str]:
+    """
+    读取解压完成标记
+    
+    输入：
+    - extract_root: 解压目录
+    
+    输出：
+    - tar_sha256: 标记中记录的sha256（未知时为空字符串），没有标记（解压未完成）时返回None
+    """
+    try:
+        with open(os.path.join(extract_root, EXTRACT_DONE_MARKER), encoding='ascii') as f:
+            return f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _has_tex(root, count_all: bool = False, suffixes: Tuple[str, ...] = ('.tex',)) -> Tuple[bool, int]:
+    """
+    用os.scandir递归查找tex文件
+    
+    输入：
+    - root: 要查找的目录
+    - count_all: 是否统计全部tex文件，默认False时找到第一个就返回
+    - suffixes: 要查找的文件后缀，默认只找 .tex
+    
+    输出：
+    - has_tex: 是否包含tex文件（布尔值）
+    - tex_count: 找到的tex文件数（count_all为False时最多为1）
+    
+    这个函数只比较文件名字符串，不为每个文件创建Path对象
+    """
+    tex_count = 0
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(suffixes):
+                        tex_count += 1
+                        if not count_all:
+                            return True, tex_count
+        except OSError:
+            continue
+    return tex_count > 0, tex_count
+
+
+def _scan_tree(root) -> Dict[str, List[str]]:
+    """
+    用os.scandir遍历一次目录树，按扩展名对文件分类
+    
+    输入：
+    - root: 要遍历的目录，如 "./arxiv_cache/1812.10695/extract"
+    
+    输出：
+    - files_by_ext: 小写扩展名（不带点，如 "tex"；没有扩展名时为 ""）-> 文件路径列表
+    
+    这个函数一次遍历同时得到tex、pdf、bib等各类文件，DirEntry自带类型信息，不需要额外stat；
+    解压完成标记不计入
+    """
+    files_by_ext = defaultdict(list)
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and entry.name != EXTRACT_DONE_MARKER:
+                        _, dot, ext = entry.name.rpartition('.')
+                        files_by_ext[ext.lower() if dot else ""].append(entry.path)
+        except OSError:
+            continue
+    return files_by_ext
+
+
+def _dir_size(root) -> int:
+    """
+    用os.scandir递归统计目录下所有文件的总大小
+    
+    输入：
+    - root: 要统计的目录，如 "./arxiv_cache/1812.10695"
+    
+    输出：
+    - total_size: 总字节数
+    """
+    total_size = 0
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        total_size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total_size
+
+
+# 论文子目录大小的缓存：子目录路径 -> (子目录的mtime, 总字节数)
+_paper_size_cache = {}
+
+# 只会被整体替换的子目录：extract/ 由 extract.tmp 改名而来，e-print/ 下的压缩包用os.replace写入，
+# 内容变化时这一层目录的mtime一定会变，可以按mtime缓存大小
+_MEMO_SUBDIRS = ("extract", "e-print")
+
+
+def _paper_dir_size(paper_dir) -> int:
+    """
+    统计单篇论文缓存目录的大小，extract/ 和 e-print/ 没有变化时直接使用上次的结果
+    
+    输入：
+    - paper_dir: 论文缓存目录，如 "./arxiv_cache/1812.10695"
+    
+    输出：
+    - total_size: 总字节数
+    
+    其他子目录（如chinarxiv写入的 translation/）里的文件可能被原地改写，目录mtime不会变，
+    所以这些子目录和论文目录下的文件每次都重新统计
+    """
+    total_size = 0
+    try:
+        with os.scandir(str(paper_dir)) as it:
+            entries = list(it)
+    except OSError:
+        return 0
+    
+    for entry in entries:
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                total_size += entry.stat(follow_symlinks=False).st_size
+            elif entry.name in _MEMO_SUBDIRS:
+                mtime = entry.stat(follow_symlinks=False).st_mtime
+                cached = _paper_size_cache.get(entry.path)
+                if cached is None or cached[0] != mtime:
+                    cached = (mtime, _dir_size(entry.path))
+                    _paper_size_cache[entry.path] = cached
+                total_size += cached[1]
+            else:
+                total_size += _dir_size(entry.path)
+        except OSError:
+            continue
+    return total_size
+
+
+# arxiv输入：可选的 abs/pdf/e-print 链接前缀 + 新格式ID(1812.10695)或旧格式ID(cs.AI/0301001)
+# + 可选版本号和.pdf后缀；id分组为去掉版本号的标准ID
+_ARXIV_RE = re.compile(
+    r'^(?:https?://(?:[\w-]+\.)*arxiv\.org/(?:abs|pdf|e-print)/)?'
+    r'(?P<id>[a-z-]+(?:\.[A-Z]{2})?/\d{7}|\d{4}\.\d{4,5})'
+    r'(?:v\d+)?(?:\.pdf)?/?(?:[?#].*)?$'
+)
+
+# 缓存目录下不是论文的子目录：blobs/ 存放按内容去重的tar包，cache/ 存放LaTeX解析结果缓存
+_NON_PAPER_DIRS = ("blobs", "cache")
+
+# 缓存索引还没有打开的标记，与打开失败时的None区分
+_INDEX_UNOPENED = object()
+
+
 class ArxivDownloader:
     """
     Arxiv论文下载器类 (优化版)
@@ -49,8 +693,25 @@ class ArxivDownloader:
     5. 应对IP限制
     """
     
+    # 固定实例属性，批量并发时每个下载器占用更少内存，属性名拼错也会直接报错
+    __slots__ = (
+        "cache_dir", "proxies", "timeout", "max_retries", "keep_tar",
+        "cache_max_bytes", "cache_max_entries", "session", "_index_lock", "_index",
+        "_tar_sha256", "arxiv_mirrors", "_mirror_cooldown", "_mirror_stats", "_mirror_lock",
+        "user_agents", "_cache_entries",
+    )
+    
+    # 除User-Agent外固定不变的请求头
+    _BASE_HEADERS = {
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.5",
+        "Accept-Encoding": "gzip, deflate",
+        "Upgrade-Insecure-Requests": "1",
+    }
+    
     def __init__(self, cache_dir: str = "./arxiv_cache", proxies: dict = None, 
-                 timeout: int = 60, max_retries: int = 3):
+                 timeout: int = 60, max_retries: int = 3, keep_tar: bool = False,
+                 cache_max_bytes: int = None, cache_max_entries: int = None):
         """
         初始化下载器
         
@@ -59,6 +720,9 @@ class ArxivDownloader:
         - proxies: 代理配置，如 {"http": "http://127.0.0.1:7890", "https": "http://127.0.0.1:7890"}
         - timeout: 下载超时时间（秒），默认60秒
         - max_retries: 最大重试次数，默认3次
+        - keep_tar: 是否保留下载的tar包（调试用），默认False时直接流式解压不落盘
+        - cache_max_bytes: 缓存总大小上限（字节），如 10 * 1024**3，默认不限制
+        - cache_max_entries: 缓存论文数上限，如 500，默认不限制
         
         输出：无
         
@@ -69,30 +733,92 @@ class ArxivDownloader:
         self.proxies = proxies or {}
         self.timeout = timeout
         self.max_retries = max_retries
+        self.keep_tar = keep_tar
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_max_entries = cache_max_entries
+        
+        # 复用同一个会话，多次下载之间保持连接，省掉重复的TCP/TLS握手
+        # 每个镜像主机一个连接池，每个池最多16个连接，够批量并发下载使用；
+        # 重试由下载循环按镜像源轮换完成，适配器层不再重复重试
+        self.session = requests.Session()
+        self.session.proxies = self.proxies
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # 缓存元数据索引，命中时只需一次查询，不用再遍历解压目录；
+        # 第一次访问缓存时才打开，只用来解析输入的临时实例不会占用数据库连接
+        self._index_lock = threading.Lock()
+        self._index = _INDEX_UNOPENED
+        # 索引的内存副本，arxiv_id -> (extract_path, tex_count, mtime)，第一次查缓存时整表载入
+        self._cache_entries = None
+        # 本次下载得到的tar包sha256，arxiv_id -> 十六进制摘要
+        self._tar_sha256 = {}
         
         # 多个arxiv镜像源，用于应对IP限制
+        # arxiv要求批量下载使用export.arxiv.org，放在最前面，主站最后再试
         self.arxiv_mirrors = [
-            "https://arxiv.org/e-print/",
+            "https://export.arxiv.org/e-print/",
             "https://cn.arxiv.org/e-print/",  # 中国镜像
-            "https://export.arxiv.org/e-print/",  # 备用源
+            "https://arxiv.org/e-print/",
         ]
+        # 返回403/429的镜像源暂停使用，镜像源 -> 恢复使用的时间戳
+        self._mirror_cooldown = {}
+        # 镜像源健康度，镜像源 -> [成功率的加权平均, 响应时间的加权平均（秒，未知时为None）]
+        self._mirror_stats = {mirror: [1.0, None] for mirror in self.arxiv_mirrors}
+        self._mirror_lock = threading.Lock()
         
         # 常用User-Agent池，避免被识别
-        self.user_agents = [
+        self.user_agents = (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0",
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:89.0) Gecko/20100101 Firefox/89.0",
-        ]
+        )
+
         
-        logger.info(f"Arxiv下载器初始化完成 (优化版)")
-        logger.info(f"缓存目录: {self.cache_dir}")
-        logger.info(f"代理配置: {self.proxies}")
-        logger.info(f"最大重试次数: {self.max_retries}")
-        logger.info(f"可用镜像源: {len(self.arxiv_mirrors)}个")
+        logger.info("Arxiv下载器初始化完成 (优化版)")
+        logger.info("缓存目录: %s", self.cache_dir)
+        logger.info("代理配置: %s", self.proxies)
+        logger.info("最大重试次数: %s", self.max_retries)
+        logger.info("可用镜像源: %s个", len(self.arxiv_mirrors))
         
-    def parse_arxiv_input(self, arxiv_input: str) -> Tuple[bool, str, str]:
+    @property
+    def index(self) -> Optional[sqlite3.Connection]:
+        """
+        缓存索引的sqlite连接，第一次访问时打开
+        
+        输出：
+        - index: sqlite连接；打开失败或下载器已关闭时返回None
+        
+        不能在持有_index_lock时第一次访问
+        """
+        if self._index is _INDEX_UNOPENED:
+            with self._index_lock:
+                if self._index is _INDEX_UNOPENED:
+                    self._index = self._open_index()
+        return self._index
+    
+    def close(self):
+        """
+        关闭HTTP会话和缓存索引
+        """
+        self.session.close()
+        with self._index_lock:
+            if self._index is not None and self._index is not _INDEX_UNOPENED:
+                self._index.close()
+            self._index = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    @staticmethod
+    def parse_arxiv_input(arxiv_input: str) -> Tuple[bool, str, str]:
         """
         解析arxiv输入，提取标准ID
         
@@ -105,52 +831,295 @@ class ArxivDownloader:
         - arxiv_id: 标准化的arxiv ID（字符串），如 "1812.10695"
         - error_msg: 错误信息（字符串）
         
-        这个函数将各种格式的arxiv输入标准化为统一的ID格式
+        这个函数将各种格式的arxiv输入标准化为统一的ID格式，
+        是静态方法，不需要创建下载器实例：ArxivDownloader.parse_arxiv_input(...)
         """
         try:
             arxiv_input = arxiv_input.strip()
-            logger.info(f"解析arxiv输入: {arxiv_input}")
-            
-            # 情况1: 直接是PDF链接
-            if arxiv_input.startswith('https://arxiv.org/pdf/') or arxiv_input.startswith('https://cn.arxiv.org/pdf/'):
-                # https://arxiv.org/pdf/1812.10695v2.pdf -> 1812.10695
-                pdf_name = arxiv_input.split('/')[-1]  # 1812.10695v2.pdf
-                arxiv_id = pdf_name.split('v')[0].replace('.pdf', '')  # 1812.10695
-                logger.info(f"从PDF链接解析出ID: {arxiv_id}")
-                return True, arxiv_id, ""
-            
-            # 情况2: abs页面链接
-            elif arxiv_input.startswith('https://arxiv.org/abs/') or arxiv_input.startswith('https://cn.arxiv.org/abs/'):
-                # https://arxiv.org/abs/1812.10695 -> 1812.10695
-                arxiv_id = arxiv_input.split('/abs/')[-1]
-                if 'v' in arxiv_id:
-                    arxiv_id = arxiv_id.split('v')[0]  # 去掉版本号
-                logger.info(f"从abs链接解析出ID: {arxiv_id}")
-                return True, arxiv_id, ""
-            
-            # 情况3: 纯ID格式
-            elif re.match(r'^\d{4}\.\d{4,5}(v\d+)?$', arxiv_input):
-                # 1812.10695 或 1812.10695v2 -> 1812.10695
-                arxiv_id = arxiv_input.split('v')[0]
-                logger.info(f"解析纯ID: {arxiv_id}")
+            match = _ARXIV_RE.match(arxiv_input)
+            if match:
+                arxiv_id = match.group('id')
+                logger.debug("解析arxiv输入: %s -> %s", arxiv_input, arxiv_id)
                 return True, arxiv_id, ""
             
-            # 情况4: 新格式ID (如 cs.AI/0301001)
-            elif re.match(r'^[a-z-]+(\.[A-Z]{2})?/\d{7}(v\d+)?$', arxiv_input):
-                arxiv_id = arxiv_input.split('v')[0]
-                logger.info(f"解析新格式ID: {arxiv_id}")
-                return True, arxiv_id, ""
-            
-            else:
-                error_msg = f"无法识别的arxiv格式: {arxiv_input}"
-                logger.error(error_msg)
-                return False, "", error_msg
+            error_msg = f"无法识别的arxiv格式: {arxiv_input}"
+            logger.error(error_msg)
+            return False, "", error_msg
                 
         except Exception as e:
             error_msg = f"解析arxiv输入时出错: {e}"
             logger.error(error_msg)
             return False, "", error_msg
     
+    def _open_index(self) -> Optional[sqlite3.Connection]:
+        """
+        打开（必要时创建）缓存目录下的sqlite索引
+        
+        输出：
+        - index: sqlite连接，打开失败时返回None（退回到目录遍历校验）
+        """
+        try:
+            index = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+            index.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "arxiv_id TEXT PRIMARY KEY, extract_path TEXT, tex_count INTEGER, "
+                "size_bytes INTEGER, mtime REAL, tar_sha256 TEXT, "
+                "downloader_version TEXT, source_url TEXT, created_at REAL, "
+                "access_count INTEGER DEFAULT 0, last_access REAL DEFAULT 0, "
+                "tar_size INTEGER, tar_mtime REAL)"
+            )
+            # 旧版本索引没有访问统计列和tar包元数据列，补上
+            columns = {row[1] for row in index.execute("PRAGMA table_info(cache)")}
+            for column, definition in (("access_count", "INTEGER DEFAULT 0"),
+                                       ("last_access", "REAL DEFAULT 0"),
+                                       ("tar_size", "INTEGER"),
+                                       ("tar_mtime", "REAL")):
+                if column not in columns:
+                    index.execute(f"ALTER TABLE cache ADD COLUMN {column} {definition}")
+            index.commit()
+            return index
+        except sqlite3.Error as e:
+            logger.warning("打开缓存索引失败，改用目录遍历校验: %s", e)
+            return None
+    
+    def _record_cache(self, arxiv_id: str, extract_path: str,
+                      source_url: str = "", tar_sha256: str = None):
+        """
+        把解压结果写入缓存索引
+        
+        输入：
+        - arxiv_id: arxiv ID，如 "1812.10695"
+        - extract_path: 最终的源码目录路径
+        - source_url: 下载地址，如 "https://arxiv.org/e-print/1812.10695"
+        - tar_sha256: tar包的sha256（可选）
+        """
+        if self.index is None:
+            return
+        
+        if tar_sha256 is None:
+            tar_sha256 = self._tar_sha256.get(arxiv_id)
+        
+        try:
+            cache_root = self.cache_dir / arxiv_id / "extract"
+            size_bytes = 0
+            tex_count = 0
+            for root, dirs, files in os.walk(self.cache_dir / arxiv_id):
+                for file in files:
+                    size_bytes += os.path.getsize(os.path.join(root, file))
+                    if file.endswith('.tex'):
+                        tex_count += 1
+            
+            # 记录tar包的大小和修改时间，下次解压前两次stat就能判断tar包是否变化
+            tar_size = tar_mtime = None
+            tar_path = self.cache_dir / arxiv_id / "e-print" / f"{arxiv_id}.tar"
+            if tar_path.exists():
+                tar_stat = os.stat(tar_path)
+                tar_size, tar_mtime = tar_stat.st_size, tar_stat.st_mtime
+            
+            extract_mtime = os.stat(cache_root).st_mtime
+            now = time.time()
+            # TinyLFU准入：新条目的访问计数用历史频率估计初始化，只请求过一次的论文最先被淘汰
+            access_count = max(1, _frequency_sketch.estimate(arxiv_id))
+            
+            with self._index_lock:
+                self.index.execute(
+                    "INSERT OR REPLACE INTO cache (arxiv_id, extract_path, tex_count, size_bytes, "
+                    "mtime, tar_sha256, downloader_version, source_url, created_at, "
+                    "access_count, last_access, tar_size, tar_mtime) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (arxiv_id, extract_path, tex_count, size_bytes, extract_mtime,
+                     tar_sha256, DOWNLOADER_VERSION, source_url, now, access_count, now,
+                     tar_size, tar_mtime)
+                )
+                self.index.commit()
+                if self._cache_entries is not None:
+                    self._cache_entries[arxiv_id] = (extract_path, tex_count, extract_mtime)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("写入缓存索引失败: %s", e)
+            return
+        
+        self._evict_if_needed(arxiv_id)
+    
+    def _cache_entry(self, arxiv_id: str) -> Optional[tuple]:
+        """
+        从缓存索引的内存副本中查找论文，第一次调用时从sqlite整表载入
+        
+        输入：
+        - arxiv_id: arxiv ID，如 "1812.10695"
+        
+        输出：
+        - entry: (extract_path, tex_count, mtime)；没有记录或没有索引时返回None
+        
+        批量检查热缓存时每次查找只是一次字典访问，不用每篇论文都查一次数据库；
+        内存副本的读写都在_index_lock内进行，与批量下载线程的写入互不干扰
+        """
+        index = self.index
+        with self._index_lock:
+            if self._cache_entries is None:
+                entries = {}
+                if index is not None:
+                    try:
+                        rows = index.execute(
+                            "SELECT arxiv_id, extract_path, tex_count, mtime FROM cache"
+                        ).fetchall()
+                        entries = {key: tuple(rest) for key, *rest in rows}
+                    except sqlite3.Error as e:
+                        logger.debug("载入缓存索引失败: %s", e)
+                self._cache_entries = entries
+            return self._cache_entries.get(arxiv_id)
+    
+    def _indexed_tar(self, arxiv_id: str) -> Optional[tuple]:
+        """
+        查询缓存索引中记录的解压结果和tar包元数据
+        
+        输入：
+        - arxiv_id: arxiv ID，如 "1812.10695"
+        
+        输出：
+        - row: (extract_path, mtime, tar_size, tar_mtime, tar_sha256)，没有记录时返回None
+        """
+        if self.index is None:
+            return None
+        
+        try:
+            with self._index_lock:
+                return self.index.execute(
+                    "SELECT extract_path, mtime, tar_size, tar_mtime, tar_sha256 "
+                    "FROM cache WHERE arxiv_id = ?", (arxiv_id,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+    
+    def _store_blob(self, tar_path: Path, tar_sha256: str):
+        """
+        把tar包按内容存到 blobs/<sha256>.tar，原路径改为硬链接
+        
+        输入：
+        - tar_path: 刚下载完成的tar文件路径
+        - tar_sha256: tar包的sha256
+        
+        这个函数让内容相同的tar包只在磁盘上保存一份；文件系统不支持硬链接时保持原文件不变
+        """
+        blobs_dir = self.cache_dir / "blobs"
+        blob_path = blobs_dir / f"{tar_sha256}.tar"
+        
+        try:
+            blobs_dir.mkdir(exist_ok=True)
+            if blob_path.exists():
+                # 相同内容已经存在，用已有的一份替换刚下载的文件
+                tmp_path = tar_path.with_suffix(".tar.tmp")
+                os.link(blob_path, tmp_path)
+                os.replace(tmp_path, tar_path)
+                logger.info("tar包内容与已有缓存相同: %s", blob_path.name)
+            else:
+                os.link(tar_path, blob_path)
+        except OSError as e:
+            logger.debug("硬链接tar包失败，保留原文件: %s", e)
+    
+    def _prune_blobs(self):
+        """
+        删除已经没有论文引用的tar包（硬链接数为1）
+        """
+        blobs_dir = self.cache_dir / "blobs"
+        if not blobs_dir.is_dir():
+            return
+        
+        try:
+            with os.scandir(blobs_dir) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_nlink <= 1:
+                        os.unlink(entry.path)
+        except OSError as e:
+            logger.debug("清理无引用的tar包失败: %s", e)
+    
+    def _touch_cache(self, arxiv_id: str):
+        """
+        缓存命中时更新访问次数和访问时间
+        
+        输入：
+        - arxiv_id: arxiv ID，如 "1812.10695"
+        """
+        if self.index is None:
+            return
+        
+        try:
+            with self._index_lock:
+                self.index.execute(
+                    "UPDATE cache SET access_count = access_count + 1, last_access = ? WHERE arxiv_id = ?",
+                    (time.time(), arxiv_id)
+                )
+                self.index.commit()
+        except sqlite3.Error as e:
+            logger.debug("更新缓存访问统计失败: %s", e)
+    
+    def _evict_if_needed(self, keep_id: str):
+        """
+        缓存超出上限时按访问频率淘汰论文
+        
+        输入：
+        - keep_id: 本次刚写入的arxiv ID，不参与淘汰
+        
+        这个函数按 访问次数、最近访问时间 从低到高删除缓存，直到总大小和论文数都在上限以内
+        """
+        if self.index is None or (self.cache_max_bytes is None and self.cache_max_entries is None):
+            return
+        
+        try:
+            with self._index_lock:
+                total_entries, total_bytes = self.index.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache"
+                ).fetchone()
+                victims = self.index.execute(
+                    "SELECT arxiv_id, size_bytes FROM cache WHERE arxiv_id != ? "
+                    "ORDER BY access_count ASC, last_access ASC",
+                    (keep_id,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("读取缓存索引失败，跳过淘汰: %s", e)
+            return
+        
+        evicted_count = 0
+        for victim_id, size_bytes in victims:
+            over_bytes = self.cache_max_bytes is not None and total_bytes > self.cache_max_bytes
+            over_entries = self.cache_max_entries is not None and total_entries > self.cache_max_entries
+            if not (over_bytes or over_entries):
+                break
+            
+            shutil.rmtree(self.cache_dir / victim_id, ignore_errors=True)
+            self._forget_cache(victim_id)
+            total_entries -= 1
+            total_bytes -= size_bytes or 0
+            evicted_count += 1
+            logger.info("缓存超出上限，淘汰: %s", victim_id)
+        
+        if evicted_count:
+            self._prune_blobs()
+            logger.info("缓存淘汰完成，共淘汰 %s 篇论文", evicted_count)
+    
+    def _forget_cache(self, arxiv_id: str):
+        """
+        从缓存索引中删除论文记录（包括旧格式ID下的子记录）
+        
+        输入：
+        - arxiv_id: arxiv ID或缓存目录名，如 "1812.10695" 或 "cs.AI"
+        """
+        if self.index is None:
+            return
+        
+        try:
+            with self._index_lock:
+                if self._cache_entries is not None:
+                    for key in [key for key in self._cache_entries
+                                if key == arxiv_id or key.startswith(f"{arxiv_id}/")]:
+                        del self._cache_entries[key]
+                self.index.execute(
+                    "DELETE FROM cache WHERE arxiv_id = ? OR arxiv_id LIKE ?",
+                    (arxiv_id, f"{arxiv_id}/%")
+                )
+                self.index.commit()
+        except sqlite3.Error as e:
+            logger.warning("删除缓存索引失败: %s", e)
+    
     def check_cache(self, arxiv_id: str) -> Optional[str]:
         """
         检查缓存中是否已有该论文
@@ -164,16 +1133,37 @@ class ArxivDownloader:
         这个函数检查指定论文是否已经下载并解压到缓存中
         """
         cache_path = self.cache_dir / arxiv_id / "extract"
+        _frequency_sketch.increment(arxiv_id)
+        
+        # 先查内存中的索引：解压目录的mtime没变就直接认为缓存有效
+        row = self._cache_entry(arxiv_id)
+        if row:
+            extract_path, tex_count, mtime = row
+            try:
+                if os.stat(cache_path).st_mtime == mtime and os.path.isdir(extract_path):
+                    logger.info("找到缓存(索引): %s", extract_path)
+                    logger.info("包含 %s 个tex文件", tex_count)
+                    self._touch_cache(arxiv_id)
+                    return extract_path
+            except OSError as e:
+                logger.debug("缓存索引校验失败，改用目录遍历: %s", e)
         
         if cache_path.exists() and cache_path.is_dir():
-            # 检查是否有tex文件
-            tex_files = list(cache_path.glob("**/*.tex"))
-            if len(tex_files) > 0:
-                logger.info(f"找到缓存: {cache_path}")
-                logger.info(f"包含 {len(tex_files)} 个tex文件")
+            # 没有完成标记说明上次解压被中断，或者标记与索引中的tar包不一致，都不能当作缓存
+            done_sha = _read_extract_marker(cache_path)
+            row = self._indexed_tar(arxiv_id) if done_sha else None
+            if done_sha is None:
+                logger.warning("解压目录缺少完成标记，删除: %s", cache_path)
+                shutil.rmtree(cache_path, ignore_errors=True)
+            elif row is not None and row[4] and row[4] != done_sha:
+                logger.warning("解压目录与tar包不一致，删除: %s", cache_path)
+                shutil.rmtree(cache_path, ignore_errors=True)
+            else:
+                logger.info("找到缓存: %s", cache_path)
+                self._record_cache(arxiv_id, str(cache_path), tar_sha256=done_sha or None)
                 return str(cache_path)
         
-        logger.info(f"未找到缓存: {arxiv_id}")
+        logger.info("未找到缓存: %s", arxiv_id)
         return None
     
     def _get_random_headers(self) -> dict:
@@ -183,80 +1173,463 @@ class ArxivDownloader:
         输出：
         - headers: 请求头字典
         """
+        headers = dict(self._BASE_HEADERS)
+        # 第一次请求时从fake_useragent抽样一批User-Agent，之后只做一次random.choice
+        headers["User-Agent"] = random.choice(_user_agent_pool(self.user_agents))
+        return headers
+    
+    def prewarm_connections(self, timeout: float = 5.0):
+        """
+        预先和每个镜像源建立连接，批量下载开始前调用
+        
+        输入：
+        - timeout: 每个镜像源的连接超时时间（秒），默认5秒
+        
+        这个函数并发地向每个镜像源发一个HEAD请求，把握手好的连接留在会话的连接池里，
+        后续下载直接复用；连接失败的镜像源会被忽略
+        """
+        def warm(mirror: str):
+            try:
+                self.session.head(mirror, headers=self._get_random_headers(),
+                                  timeout=timeout, allow_redirects=False)
+            except requests.RequestException as e:
+                logger.debug("预连接镜像源失败 %s: %s", mirror, e)
+        
+        with ThreadPoolExecutor(max_workers=len(self.arxiv_mirrors)) as executor:
+            list(executor.map(warm, self.arxiv_mirrors))
+    
+    def _available_mirrors(self) -> List[Tuple[int, str]]:
+        """
+        获取当前没有被暂停的镜像源，按健康度排序
+        
+        输出：
+        - mirrors: (序号, 镜像源地址) 列表；所有镜像源都在暂停中时返回全部镜像源
+        
+        成功率高的镜像源排在前面（保留一位小数，避免小波动就换序），成功率相同时响应快的优先，
+        还没有成功过的镜像源排在有记录的后面，最后按配置顺序
+        """
+        now = time.time()
+        mirrors = [(idx, mirror) for idx, mirror in enumerate(self.arxiv_mirrors)
+                   if self._mirror_cooldown.get(mirror, 0) <= now]
+        mirrors = mirrors or list(enumerate(self.arxiv_mirrors))
+        
+        def score(item):
+            idx, mirror = item
+            success_rate, latency = self._mirror_stats.get(mirror, (1.0, None))
+            return (-round(success_rate, 1), float('inf') if latency is None else latency, idx)
+        
+        with self._mirror_lock:
+            return sorted(mirrors, key=score)
+    
+    def _should_race(self, mirrors: List[Tuple[int, str]]) -> bool:
+        """
+        判断是否需要并发探测镜像源
+        
+        输入：
+        - mirrors: _available_mirrors() 返回的 (序号, 镜像源地址) 列表
+        
+        输出：
+        - race: 排在最前的镜像源不健康、且有其他镜像源可选时为True
+        
+        排在最前的镜像源状态良好时直接向它发GET，不多花一次HEAD往返，也不去打扰靠后的arxiv主站
+        """
+        if len(mirrors) < 2:
+            return False
+        with self._mirror_lock:
+            success_rate, _ = self._mirror_stats.get(mirrors[0][1], (1.0, None))
+        return success_rate < MIRROR_HEALTHY_RATE
+    
+    def _race_head(self, arxiv_id: str, mirrors: List[Tuple[int, str]]) -> Tuple[Optional[Tuple[str, int]], bool]:
+        """
+        并发向各个镜像源发HEAD请求，取最先返回200的镜像源
+        
+        输入：
+        - arxiv_id: arXiv ID，如 "2301.07041"
+        - mirrors: _available_mirrors() 返回的 (序号, 镜像源地址) 列表
+        
+        输出：
+        - winner: (镜像源地址, 文件大小)；没有镜像源返回200时为None
+        - not_found: 是否所有镜像源都返回了404
+        
+        这个函数把串行尝试镜像源的多次往返变成一次最慢往返。探测只使用令牌桶里现成的令牌，
+        不等待也不透支，不会拖慢之后真正的GET；胜出后还没发出的探测直接放弃。
+        403/429等错误与GET一样计入镜像源健康度并触发暂停
+        """
+        stop_event = threading.Event()
+        
+        def probe(mirror_base: str) -> Optional[Tuple[str, int]]:
+            url = f"{mirror_base}{arxiv_id}"
+            if stop_event.is_set() or not _host_bucket(url).try_reserve():
+                return None
+            response = self.session.head(url, headers=self._get_random_headers(),
+                                         timeout=self.timeout, allow_redirects=True)
+            response.raise_for_status()
+            return mirror_base, int(response.headers.get('content-length', 0))
+        
+        executor = ThreadPoolExecutor(max_workers=len(mirrors))
+        try:
+            futures = {executor.submit(probe, mirror_base): mirror_base for _, mirror_base in mirrors}
+            not_found = 0
+            for future in as_completed(futures):
+                mirror_base = futures[future]
+                try:
+                    winner = future.result()
+                except requests.exceptions.HTTPError as e:
+                    logger.debug("HEAD探测失败: %s", e)
+                    status_code = e.response.status_code
+                    self._cool_down_mirror(mirror_base, status_code, e.response.headers)
+                    if status_code == 404:
+                        not_found += 1
+                    else:
+                        self._record_mirror_result(mirror_base, False)
+                    continue
+                except (requests.RequestException, ValueError) as e:
+                    logger.debug("HEAD探测失败: %s", e)
+                    continue
+                if winner is None:
+                    continue
+                stop_event.set()
+                logger.debug("HEAD探测最快的镜像源: %s", winner[0])
+                return winner, False
+            return None, not_found == len(futures)
+        finally:
+            stop_event.set()
+            executor.shutdown(wait=False)
+    
+    def _record_mirror_result(self, mirror_base: str, success: bool, latency: float = None):
+        """
+        更新镜像源的健康度
+        
+        输入：
+        - mirror_base: 镜像源地址，如 "https://export.arxiv.org/e-print/"
+        - success: 请求是否成功（论文不存在的404不算镜像源的问题，不要记录）
+        - latency: 成功时从发出请求到收到响应头的时间（秒）
+        """
+        with self._mirror_lock:
+            stats = self._mirror_stats.setdefault(mirror_base, [1.0, None])
+            stats[0] += MIRROR_SCORE_ALPHA * ((1.0 if success else 0.0) - stats[0])
+            if latency is not None and stats[1] is None:
+                stats[1] = latency
+            elif latency is not None:
+                stats[1] += MIRROR_SCORE_ALPHA * (latency - stats[1])
+    
+    def _cool_down_mirror(self, mirror_base: str, status_code: int, headers=None):
+        """
+        镜像源返回403/429（或带Retry-After的503）后暂停使用一段时间
+        
+        输入：
+        - mirror_base: 镜像源地址，如 "https://arxiv.org/e-print/"
+        - status_code: HTTP状态码
+        - headers: 响应头（可选），有Retry-After时按它决定暂停时间
+        """
+        retry_after = _parse_retry_after(headers.get("Retry-After")) if headers else None
+        if status_code in (403, 429) or (status_code == 503 and retry_after is not None):
+            cooldown = MIRROR_COOLDOWN_SECONDS if retry_after is None else retry_after
+            self._mirror_cooldown[mirror_base] = time.time() + cooldown
+            logger.warning("镜像源 %s 返回 %s，暂停使用 %.0f 秒", mirror_base, status_code, cooldown)
+    
+    def _sleep_for_retry(self, retry_index: int, response=None, error: Exception = None):
+        """
+        按上一次失败的原因决定重试前等待多久
+        
+        输入：
+        - retry_index: 第几次重试，从1开始
+        - response: 上一次失败的HTTP响应（可选），有Retry-After时按它等待
+        - error: 上一次失败的异常（可选）
+        
+        这个函数优先遵守服务器的Retry-After；连接被拒绝或重置时很快重试，
+        超时和其他错误使用带随机抖动的指数退避
+        """
+        delay = _parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if delay is None:
+            if (isinstance(error, requests.exceptions.ConnectionError)
+                    and not isinstance(error, requests.exceptions.Timeout)):
+                delay = 0.5
+            else:
+                delay = min(2 ** retry_index + random.uniform(0, 0.5), 30)
+        
+        logger.info("重试延迟 %.2f 秒", delay)
+        time.sleep(delay)
+    
+    def _add_random_delay(self, min_delay: float = 0.5, max_delay: float = 2.0):
+        """
+        添加随机延迟，避免请求过于频繁
+        
+        输入：
+        - min_delay: 最小延迟时间（秒）
+        - max_delay: 最大延迟时间（秒）
+        """
+        delay = random.uniform(min_delay, max_delay)
+        logger.debug("随机延迟 %.2f 秒", delay)
+        time.sleep(delay)
+    
+    def _verify_file_integrity(self, file_path: str, expected_size: int = None) -> bool:
+        """
+        验证文件完整性
+        
+        输入：
+        - file_path: 文件路径
+        - expected_size: 期望的文件大小（字节）
+        
+        输出：
+        - is_valid: 文件是否完整有效
+        """
+        try:
+            # 一次stat同时判断是否存在和取得大小
+            try:
+                file_size = os.stat(file_path).st_size
+            except FileNotFoundError:
+                return False
+            
+            # 检查文件大小，大小不对就不用再打开tar包
+            if file_size == 0:
+                logger.warning("文件为空: %s", file_path)
+                return False
+            
+            if expected_size and abs(file_size - expected_size) > 1024:  # 允许1KB误差
+                logger.warning("文件大小不匹配: 期望%s, 实际%s", expected_size, file_size)
+                return False
+            
+            # 检查是否为有效的tar文件：流式模式只读第一个成员的头部，不遍历整个文件
+            # 完整的成员遍历在解压时进行，那时才会发现后面的损坏
+            try:
+                with tarfile.open(file_path, mode='r|*') as tar:
+                    if tar.next() is None:
+                        logger.warning("tar文件为空: %s", file_path)
+                        return False
+            except tarfile.ReadError:
+                logger.warning("tar文件损坏: %s", file_path)
+                return False
+            
+            return True
+            
+        except Exception as e:
+            logger.error("验证文件完整性时出错: %s", e)
+            return False
+    
+    def _report_progress(self, writer: _HashingWriter, expected_size: int,
+                         stop_event: threading.Event):
+        """
+        后台线程：每秒输出一次下载进度
+        
+        输入：
+        - writer: 正在写入的下载文件包装对象
+        - expected_size: 期望的文件大小（字节），未知时为0
+        - stop_event: 下载结束时设置的事件
+        
+        这个函数按时间采样已写入的字节数，不在每个数据块上做进度判断；
+        安装了tqdm时显示单行进度条，否则每秒输出一条日志
+        """
+        bar = None
+        if tqdm is not None:
+            bar = tqdm(total=expected_size or None, unit='B', unit_scale=True, unit_divisor=1024,
+                       desc="下载进度", leave=False)
+        
+        reported = 0
+        try:
+            while not stop_event.wait(1.0):
+                downloaded_size = writer.written
+                
+                if bar is not None:
+                    bar.update(downloaded_size - reported)
+                    reported = downloaded_size
+                elif not logger.isEnabledFor(logging.INFO):
+                    # 日志级别高于INFO时不输出进度，也省掉百分比计算
+                    continue
+                elif expected_size > 0:
+                    logger.info("下载进度: %.1f%% (%dKB/%dKB)", downloaded_size / expected_size * 100,
+                                downloaded_size // 1024, expected_size // 1024)
+                else:
+                    logger.info("已下载: %dKB", downloaded_size // 1024)
+        finally:
+            if bar is not None:
+                bar.close()
+    
+    def _download_single(self, response, tar_path: Path, expected_size: int) -> Tuple[int, str]:
+        """
+        单连接流式下载tar包
+        
+        输入：
+        - response: 已经发出的流式GET响应
+        - tar_path: 保存路径
+        - expected_size: 响应头中的文件大小（字节），未知时为0
+        
+        输出：
+        - downloaded_size: 实际下载的字节数
+        - tar_sha256: 文件的sha256
+        """
+        # 让urllib3按Content-Encoding解码，和iter_content行为一致
+        response.raw.decode_content = True
+        
+        # 保存文件：大缓冲区整块拷贝，减少write系统调用次数；写入时顺带计算sha256
+        hasher = hashlib.sha256()
+        stop_event = threading.Event()
+        part_path = _part_path(tar_path)
+        try:
+            with open(part_path, 'wb') as f:
+                if expected_size > 0:
+                    # 预分配文件大小，减少文件系统碎片
+                    f.truncate(expected_size)
+                
+                writer = _HashingWriter(f, hasher)
+                progress_thread = threading.Thread(
+                    target=self._report_progress,
+                    args=(writer, expected_size, stop_event),
+                    daemon=True
+                )
+                progress_thread.start()
+                try:
+                    shutil.copyfileobj(response.raw, writer, length=DOWNLOAD_BUFFER_SIZE)
+                finally:
+                    stop_event.set()
+                    progress_thread.join()
+                
+                # 实际大小和预分配大小不一致时截断到真实长度
+                downloaded_size = f.tell()
+                f.truncate(downloaded_size)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+        
+        os.replace(part_path, tar_path)
+        return downloaded_size, hasher.hexdigest()
+    
+    def _can_download_ranges(self, response, expected_size: int) -> bool:
+        """
+        判断是否可以多连接分段下载
+        
+        输入：
+        - response: 整个文件的GET响应
+        - expected_size: 文件大小（字节）
+        
+        输出：
+        - can_split: 文件足够大、服务器支持Range且未做传输压缩时返回True
+        """
+        return (
+            hasattr(os, 'pwrite')
+            and expected_size >= RANGE_DOWNLOAD_THRESHOLD
+            and 'bytes' in response.headers.get('accept-ranges', '').lower()
+            and not response.headers.get('content-encoding')
+        )
+    
+    def _download_ranges(self, download_url: str, tar_path: Path, total_size: int,
+                         headers: dict, first_response) -> Tuple[int, str]:
+        """
+        多连接HTTP Range分段下载tar包
+        
+        输入：
+        - download_url: 下载地址
+        - tar_path: 保存路径
+        - total_size: 文件大小（字节）
+        - headers: 请求头
+        - first_response: 已经发出的整个文件的GET响应，用来读取第一段
+        
+        输出：
+        - downloaded_size: 实际下载的字节数
+        - tar_sha256: 文件的sha256
+        
+        这个函数把文件等分成若干段并发下载，各段用os.pwrite直接写到预分配文件的对应偏移，
+        不需要加锁；第一段直接从已有的响应中读取，其余各段各发一个Range请求；
+        任何一段失败都会抛出异常，由调用方切换镜像源重试。数据先写到临时文件，完成后才替换tar_path
+        """
+        part_size = -(-total_size // RANGE_DOWNLOAD_PARTS)
+        ranges = [(start, min(start + part_size, total_size) - 1)
+                  for start in range(0, total_size, part_size)]
+        logger.info("分段下载: %d 段, 共 %d 字节", len(ranges), total_size)
+        
+        part_path = _part_path(tar_path)
+        fd = os.open(str(part_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         try:
-            # 优先使用fake_useragent
-            ua = UserAgent()
-            user_agent = ua.random
-        except:
-            # 如果fake_useragent失败，从预设列表中随机选择
-            user_agent = random.choice(self.user_agents)
-        
-        headers = {
-            "User-Agent": user_agent,
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Accept-Encoding": "gzip, deflate",
-            "Connection": "keep-alive",
-            "Upgrade-Insecure-Requests": "1",
-        }
+            os.ftruncate(fd, total_size)
+            
+            def write_range(response, start: int, end: int) -> int:
+                # 只写到end为止，第一段的响应后面还有整个文件的剩余部分
+                offset = start
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_BUFFER_SIZE):
+                    view = memoryview(chunk)[:end + 1 - offset]
+                    while view:
+                        written = os.pwrite(fd, view, offset)
+                        offset += written
+                        view = view[written:]
+                    if offset > end:
+                        break
+                return offset
+            
+            def fetch_range(byte_range: Tuple[int, int]) -> int:
+                start, end = byte_range
+                if start == 0:
+                    offset = write_range(first_response, start, end)
+                else:
+                    part_headers = dict(headers)
+                    part_headers["Range"] = f"bytes={start}-{end}"
+                    # 分段偏移针对原始字节，不能让服务器再压缩
+                    part_headers["Accept-Encoding"] = "identity"
+                    
+                    _wait_for_token(download_url)
+                    with self.session.get(download_url, headers=part_headers,
+                                          timeout=self.timeout, stream=True) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise requests.exceptions.HTTPError(
+                                f"服务器未返回分段内容: {response.status_code}", response=response
+                            )
+                        offset = write_range(response, start, end)
+                
+                if offset != end + 1:
+                    raise IOError(f"分段 {start}-{end} 不完整: 收到 {offset - start} 字节")
+                return offset - start
+            
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                downloaded_size = sum(pool.map(fetch_range, ranges))
+            if downloaded_size != total_size:
+                raise IOError(f"分段下载大小不符: 期望 {total_size}, 实际 {downloaded_size}")
+        except BaseException:
+            os.close(fd)
+            part_path.unlink(missing_ok=True)
+            raise
+        os.close(fd)
         
-        return headers
+        # 分段乱序写入，写完后顺序读一遍计算sha256（数据刚写入，还在页缓存中）
+        tar_sha256 = _file_sha256(part_path)
+        os.replace(part_path, tar_path)
+        return downloaded_size, tar_sha256
     
-    def _add_random_delay(self, min_delay: float = 0.5, max_delay: float = 2.0):
+    def _write_tar_meta(self, tar_path: Path, response, tar_sha256: str):
         """
-        添加随机延迟，避免请求过于频繁
+        保存tar包的下载地址、缓存校验头和sha256，供之后的条件请求使用
         
         输入：
-        - min_delay: 最小延迟时间（秒）
-        - max_delay: 最大延迟时间（秒）
+        - tar_path: tar文件路径
+        - response: 下载时的HTTP响应
+        - tar_sha256: tar包的sha256
         """
-        delay = random.uniform(min_delay, max_delay)
-        logger.debug(f"随机延迟 {delay:.2f} 秒")
-        time.sleep(delay)
+        meta = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": tar_sha256,
+        }
+        try:
+            with open(f"{tar_path}.meta", 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except OSError as e:
+            logger.debug("保存tar包元数据失败: %s", e)
     
-    def _verify_file_integrity(self, file_path: str, expected_size: int = None) -> bool:
+    def _read_tar_meta(self, tar_path: Path) -> Optional[dict]:
         """
-        验证文件完整性
+        读取tar包元数据
         
         输入：
-        - file_path: 文件路径
-        - expected_size: 期望的文件大小（字节）
+        - tar_path: tar文件路径
         
         输出：
-        - is_valid: 文件是否完整有效
+        - meta: 包含 url、etag、last_modified、sha256 的字典，没有或无法读取时返回None
         """
         try:
-            if not os.path.exists(file_path):
-                return False
-            
-            file_size = os.path.getsize(file_path)
-            
-            # 检查文件大小
-            if file_size == 0:
-                logger.warning(f"文件为空: {file_path}")
-                return False
-            
-            if expected_size and abs(file_size - expected_size) > 1024:  # 允许1KB误差
-                logger.warning(f"文件大小不匹配: 期望{expected_size}, 实际{file_size}")
-                return False
-            
-            # 检查是否为有效的tar文件
-            try:
-                with tarfile.open(file_path, 'r') as tar:
-                    # 尝试读取文件列表
-                    members = tar.getnames()
-                    if len(members) == 0:
-                        logger.warning(f"tar文件为空: {file_path}")
-                        return False
-            except tarfile.ReadError:
-                logger.warning(f"tar文件损坏: {file_path}")
-                return False
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"验证文件完整性时出错: {e}")
-            return False
+            with open(f"{tar_path}.meta", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
     
     def download_arxiv_source(self, arxiv_id: str) -> Tuple[bool, str, str]:
         """
@@ -279,120 +1652,175 @@ class ArxivDownloader:
         tar_path = download_dir / f"{arxiv_id}.tar"
         
         # 如果已经下载过且文件完整，直接返回
+        # 本地tar包校验失败但有下载记录时，只保留条件请求需要的信息：
+        # 下载地址、条件请求头，以及下载时的sha256（304时用来确认本地文件没变）
+        cached_url = None
+        cached_headers = {}
+        cached_sha256 = None
         if tar_path.exists():
+            meta = self._read_tar_meta(tar_path)
             if self._verify_file_integrity(str(tar_path)):
-                logger.info(f"tar文件已存在且完整: {tar_path}")
+                logger.info("tar文件已存在且完整: %s", tar_path)
+                if meta and meta.get("sha256"):
+                    self._tar_sha256[arxiv_id] = meta["sha256"]
                 return True, str(tar_path), ""
+            elif meta and meta.get("sha256") and (meta.get("etag") or meta.get("last_modified")):
+                # 校验失败可能只是偶发错误：先用条件请求问服务器文件是否变化，没变化就不用重新下载
+                logger.warning("tar文件校验失败，发送条件请求确认: %s", tar_path)
+                cached_url = meta.get("url")
+                cached_sha256 = meta["sha256"]
+                if meta.get("etag"):
+                    cached_headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    cached_headers["If-Modified-Since"] = meta["last_modified"]
             else:
-                logger.warning(f"删除损坏的tar文件: {tar_path}")
+                logger.warning("删除损坏的tar文件: %s", tar_path)
                 tar_path.unlink()
         
         # 开始多重试下载
         last_error = ""
+        last_response = None
+        last_exception = None
+        not_found = False                   # 上一轮所有镜像源是否都返回了404
         
         for retry in range(self.max_retries):
-            logger.info(f"开始下载 (尝试 {retry + 1}/{self.max_retries}): {arxiv_id}")
+            logger.info("开始下载 (尝试 %s/%s): %s", retry + 1, self.max_retries, arxiv_id)
             
             # 在重试时添加延迟
             if retry > 0:
-                retry_delay = 2 ** retry + random.uniform(0, 1)  # 指数退避 + 随机抖动
-                logger.info(f"重试延迟 {retry_delay:.2f} 秒")
-                time.sleep(retry_delay)
+                self._sleep_for_retry(retry, last_response, last_exception)
+                last_response = None
+                last_exception = None
+            
+            # 排在最前的镜像源不健康时，先并发探测各镜像源，把最快响应200的排到最前；
+            # 都没有响应时按原顺序逐个尝试。上一轮全部404时论文多半不存在，不再探测
+            mirrors = self._available_mirrors()
+            if not not_found and self._should_race(mirrors):
+                winner, race_not_found = self._race_head(arxiv_id, mirrors)
+                if winner is not None:
+                    mirrors.sort(key=lambda item: item[1] != winner[0])
+                elif race_not_found:
+                    not_found = True
+                    last_error = "HTTP错误: 所有镜像源都返回404"
+                    logger.warning("第 %s 次尝试失败，所有镜像源都返回404", retry + 1)
+                    continue
             
             # 尝试每个镜像源
-            for mirror_idx, mirror_base in enumerate(self.arxiv_mirrors):
+            not_found_count = 0
+            for attempt, (mirror_idx, mirror_base) in enumerate(mirrors):
                 try:
                     download_url = f"{mirror_base}{arxiv_id}"
                     headers = self._get_random_headers()
+                    if cached_sha256 is not None and cached_url == download_url:
+                        headers.update(cached_headers)
                     
-                    logger.info(f"尝试镜像源 {mirror_idx + 1}: {download_url}")
-                    logger.debug(f"使用 User-Agent: {headers['User-Agent'][:50]}...")
+                    logger.info("尝试镜像源 %s: %s", mirror_idx + 1, download_url)
+                    logger.debug("使用 User-Agent: %.50s...", headers['User-Agent'])
                     
                     # 添加随机延迟
-                    if mirror_idx > 0 or retry > 0:
+                    if attempt > 0 or retry > 0:
                         self._add_random_delay(0.5, 1.5)
                     
-                    # 发送HEAD请求获取文件信息
-                    head_response = requests.head(
+                    _wait_for_token(download_url)
+                    # 同一镜像主机同时进行的下载数有上限
+                    # 直接发GET，从响应头读取文件大小，不再单独发HEAD请求，省一次往返
+                    with _host_slot(download_url), self.session.get(
                         download_url,
-                        proxies=self.proxies,
-                        timeout=10,
-                        headers=headers
-                    )
-                    
-                    if head_response.status_code != 200:
-                        logger.warning(f"HEAD请求失败: {head_response.status_code}")
-                        continue
-                    
-                    expected_size = int(head_response.headers.get('content-length', 0))
-                    logger.info(f"文件大小: {expected_size} 字节")
-                    
-                    # 发送下载请求
-                    response = requests.get(
-                        download_url, 
-                        proxies=self.proxies, 
                         timeout=self.timeout,
                         headers=headers,
                         stream=True
-                    )
-                    response.raise_for_status()
-                    
-                    # 保存文件 (优化chunk大小提升速度)
-                    downloaded_size = 0
-                    chunk_size = 32768  # 32KB chunks for better speed
-                    last_progress_log = 0
-                    
-                    with open(tar_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=chunk_size):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                
-                                # 每下载1MB显示一次进度
-                                if downloaded_size - last_progress_log >= 1024 * 1024:
-                                    if expected_size > 0:
-                                        progress = (downloaded_size / expected_size) * 100
-                                        logger.info(f"下载进度: {progress:.1f}% ({downloaded_size//1024}KB/{expected_size//1024}KB)")
-                                    else:
-                                        logger.info(f"已下载: {downloaded_size//1024}KB")
-                                    last_progress_log = downloaded_size
-                    
-                    # 验证下载的文件
-                    if self._verify_file_integrity(str(tar_path), expected_size):
-                        logger.info(f"下载完成: {tar_path} ({downloaded_size} 字节)")
-                        return True, str(tar_path), ""
-                    else:
-                        logger.error(f"下载的文件不完整，删除并重试")
-                        tar_path.unlink()
-                        continue
+                    ) as response:
+                        response.raise_for_status()
+                        self._record_mirror_result(mirror_base, True, response.elapsed.total_seconds())
+                        
+                        if response.status_code == 304:
+                            # 服务器上的文件没变化，本地文件与下载时通过校验的文件逐字节相同就直接使用；
+                            # 本地校验是确定性的，不再对同样的内容重复校验
+                            if _file_sha256(tar_path) == cached_sha256:
+                                self._tar_sha256[arxiv_id] = cached_sha256
+                                logger.info("服务器返回304，本地tar文件内容未变化: %s", tar_path)
+                                return True, str(tar_path), ""
+                            logger.warning("本地tar文件内容已损坏，重新下载: %s", tar_path)
+                            cached_sha256 = None
+                            tar_path.unlink()
+                            continue
+                        
+                        if cached_sha256 is not None:
+                            # 服务器返回了新内容：旧文件可能是共享tar包的硬链接，先删掉这个目录项再写新文件，
+                            # 分段请求也不再带条件请求头
+                            cached_sha256 = None
+                            tar_path.unlink(missing_ok=True)
+                            for name in cached_headers:
+                                headers.pop(name, None)
+                        
+                        # 传输压缩时Content-Length是压缩后的长度，和解码后写入的大小对不上
+                        if response.headers.get('content-encoding'):
+                            expected_size = 0
+                        else:
+                            expected_size = int(response.headers.get('content-length', 0))
+                        logger.info("文件大小: %s 字节", expected_size)
+                        
+                        # 大文件且服务器支持Range时多连接分段下载，否则单连接流式下载
+                        if self._can_download_ranges(response, expected_size):
+                            downloaded_size, tar_sha256 = self._download_ranges(
+                                download_url, tar_path, expected_size, headers, response
+                            )
+                        else:
+                            downloaded_size, tar_sha256 = self._download_single(
+                                response, tar_path, expected_size
+                            )
+                        
+                        # 验证下载的文件
+                        if self._verify_file_integrity(str(tar_path), expected_size):
+                            self._tar_sha256[arxiv_id] = tar_sha256
+                            self._store_blob(tar_path, tar_sha256)
+                            self._write_tar_meta(tar_path, response, tar_sha256)
+                            logger.info("下载完成: %s (%s 字节, sha256: %s)", tar_path, downloaded_size, tar_sha256[:12])
+                            return True, str(tar_path), ""
+                        else:
+                            logger.error("下载的文件不完整，删除并重试")
+                            tar_path.unlink()
+                            continue
                         
                 except requests.exceptions.Timeout as e:
                     last_error = f"下载超时: {e}"
-                    logger.warning(f"镜像源 {mirror_idx + 1} 超时: {e}")
+                    last_exception = e
+                    self._record_mirror_result(mirror_base, False)
+                    logger.warning("镜像源 %s 超时: %s", mirror_idx + 1, e)
                     continue
                     
                 except requests.exceptions.HTTPError as e:
                     last_error = f"HTTP错误: {e}"
                     if e.response.status_code == 403:
-                        logger.warning(f"镜像源 {mirror_idx + 1} 被禁止访问(403)，可能IP被限制")
+                        logger.warning("镜像源 %s 被禁止访问(403)，可能IP被限制", mirror_idx + 1)
                     elif e.response.status_code == 429:
-                        logger.warning(f"镜像源 {mirror_idx + 1} 请求过于频繁(429)")
-                        time.sleep(5)  # 额外等待
+                        logger.warning("镜像源 %s 请求过于频繁(429)", mirror_idx + 1)
                     else:
-                        logger.warning(f"镜像源 {mirror_idx + 1} HTTP错误: {e}")
+                        logger.warning("镜像源 %s HTTP错误: %s", mirror_idx + 1, e)
+                    # 不再原地等待，暂停这个镜像源，直接换下一个
+                    self._cool_down_mirror(mirror_base, e.response.status_code, e.response.headers)
+                    if e.response.status_code != 404:
+                        self._record_mirror_result(mirror_base, False)
+                    else:
+                        not_found_count += 1
+                    last_response = e.response
+                    last_exception = e
                     continue
                     
                 except requests.exceptions.RequestException as e:
                     last_error = f"请求错误: {e}"
-                    logger.warning(f"镜像源 {mirror_idx + 1} 请求失败: {e}")
+                    last_exception = e
+                    self._record_mirror_result(mirror_base, False)
+                    logger.warning("镜像源 %s 请求失败: %s", mirror_idx + 1, e)
                     continue
                     
                 except Exception as e:
                     last_error = f"未知错误: {e}"
-                    logger.error(f"镜像源 {mirror_idx + 1} 未知错误: {e}")
+                    logger.error("镜像源 %s 未知错误: %s", mirror_idx + 1, e)
                     continue
             
-            logger.warning(f"第 {retry + 1} 次尝试失败，所有镜像源都无法使用")
+            not_found = not_found_count == len(mirrors)
+            logger.warning("第 %s 次尝试失败，所有镜像源都无法使用", retry + 1)
         
         # 所有重试都失败了
         error_msg = f"下载失败，已重试 {self.max_retries} 次: {last_error}"
@@ -416,90 +1844,359 @@ class ArxivDownloader:
         """
         try:
             extract_path = self.cache_dir / arxiv_id / "extract"
+            row = self._indexed_tar(arxiv_id)
+            
+            # tar包的大小、修改时间和解压目录的mtime都与索引一致，说明上次解压的结果仍然有效
+            if row is not None and row[2] is not None:
+                indexed_path, mtime, tar_size, tar_mtime, _ = row
+                try:
+                    tar_stat = os.stat(tar_path)
+                    if (tar_stat.st_size == tar_size and tar_stat.st_mtime == tar_mtime
+                            and os.stat(extract_path).st_mtime == mtime
+                            and os.path.isdir(indexed_path)):
+                        logger.info("tar包未变化，复用已有解压目录: %s", indexed_path)
+                        return True, indexed_path, ""
+                except OSError:
+                    pass
             
             # 如果已经解压过，检查是否完整
             if extract_path.exists():
-                tex_files = list(extract_path.glob("**/*.tex"))
-                if len(tex_files) > 0:
-                    logger.info(f"解压目录已存在且包含tex文件: {extract_path}")
-                    return True, str(extract_path), ""
+                # 有完成标记，且tar包内容和上次解压时相同（或无法判断）才复用已有的解压目录；
+                # 否则保留旧目录，新的解压完成后整体替换
+                done_sha = _read_extract_marker(extract_path)
+                tar_sha256 = self._tar_sha256.get(arxiv_id)
+                if done_sha is None:
+                    logger.info("解压目录不完整，重新解压: %s", extract_path)
+                elif tar_sha256 and done_sha and done_sha != tar_sha256:
+                    logger.info("tar包内容已变化，重新解压: %s", extract_path)
                 else:
-                    # 删除不完整的解压目录
-                    shutil.rmtree(extract_path)
-                    logger.info(f"删除不完整的解压目录: {extract_path}")
-            
-            extract_path.mkdir(parents=True, exist_ok=True)
-            logger.info(f"开始解压: {tar_path} -> {extract_path}")
+                    logger.info("解压目录已存在且已完成解压: %s", extract_path)
+                    return True, str(extract_path), ""
             
-            # 首先验证tar文件
-            if not self._verify_file_integrity(tar_path):
-                error_msg = f"tar文件损坏或不完整: {tar_path}"
-                logger.error(error_msg)
-                return False, "", error_msg
+            # 先解压到临时目录，完成后再改名，解压中途中断不会留下不完整的 extract 目录
+            tmp_path = self.cache_dir / arxiv_id / "extract.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            tmp_path.mkdir(parents=True, exist_ok=True)
+            logger.info("开始解压: %s -> %s", tar_path, extract_path)
             
+            # 不再单独校验tar文件：下载时已经检查过，损坏的tar包在解压时会报ReadError
             # 解压tar文件 (增强安全性和错误处理)
             extracted_count = 0
-            try:
-                with tarfile.open(tar_path, 'r') as tar:
-                    # 安全检查：防止路径遍历攻击和过大文件
-                    def is_safe_member(member):
-                        # 检查路径
-                        if member.name.startswith('/') or '..' in member.name:
-                            return False
-                        # 检查文件大小 (限制单个文件最大100MB)
-                        if member.size > 100 * 1024 * 1024:
-                            logger.warning(f"跳过过大文件: {member.name} ({member.size} bytes)")
-                            return False
-                        return True
-                    
-                    safe_members = [m for m in tar.getmembers() if is_safe_member(m)]
-                    
-                    # 批量解压
-                    for member in safe_members:
-                        try:
-                            tar.extract(member, path=extract_path)
-                            extracted_count += 1
-                        except Exception as e:
-                            logger.warning(f"跳过解压文件 {member.name}: {e}")
-                            continue
-                    
-            except tarfile.ReadError as e:
-                error_msg = f"tar文件格式错误: {e}"
-                logger.error(error_msg)
-                return False, "", error_msg
+            result = None
             
-            # 检查解压结果
-            extracted_files = list(extract_path.glob("**/*"))
-            tex_files = list(extract_path.glob("**/*.tex"))
-            
-            logger.info(f"解压完成: 成功解压 {extracted_count} 个文件")
-            logger.info(f"发现文件: {len(extracted_files)} 个总文件")
-            logger.info(f"发现tex文件: {len(tex_files)} 个")
+            # 优先使用libarchive，在C中完成解压缩和解包
+            if libarchive is not None:
+                try:
+                    extracted_count = self._extract_with_libarchive(tar_path, tmp_path)
+                    result = self._finish_extract(arxiv_id, tmp_path, extracted_count)
+                except Exception as e:
+                    logger.warning("libarchive解压失败，改用tarfile: %s", e)
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    tmp_path.mkdir(parents=True, exist_ok=True)
             
-            if len(tex_files) == 0:
-                # 检查是否有其他类型的文档文件
-                doc_files = list(extract_path.glob("**/*.pdf")) + \
-                           list(extract_path.glob("**/*.ps")) + \
-                           list(extract_path.glob("**/*.dvi"))
+            if result is None:
+                try:
+                    # 流式模式一遍读完，边遍历边做安全检查和解压，不再先getmembers再解压
+                    with open(tar_path, 'rb', buffering=EXTRACT_BUFFER_SIZE) as f:
+                        if hasattr(os, 'sendfile') and not _is_compressed(f):
+                            # 未压缩的tar包：成员数据用sendfile在内核中直接拷贝
+                            with _SendfileTarFile.open(fileobj=f, mode='r:') as tar:
+                                extracted_count = self._extract_members(tar, tmp_path)
+                        else:
+                            extracted_count = self._extract_stream(f, tmp_path)
+                    
+                    result = self._finish_extract(arxiv_id, tmp_path, extracted_count)
                 
-                if len(doc_files) > 0:
-                    logger.warning(f"未找到tex文件，但找到 {len(doc_files)} 个文档文件")
-                    # 对于只有PDF等文件的情况，也认为是成功的
-                else:
-                    error_msg = f"解压后未找到tex或文档文件: {extract_path}"
+                except tarfile.ReadError as e:
+                    error_msg = f"tar文件格式错误: {e}"
                     logger.error(error_msg)
-                    return False, "", error_msg
+                    result = (False, "", error_msg)
             
-            # 处理单层文件夹包装的情况
-            extract_path = self._handle_folder_wrapper(extract_path)
-            
-            return True, str(extract_path), ""
+            # 成功时临时目录已经改名，失败时删掉
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return result
             
         except Exception as e:
             error_msg = f"解压过程出错: {e}"
             logger.error(error_msg)
+            shutil.rmtree(self.cache_dir / arxiv_id / "extract.tmp", ignore_errors=True)
             return False, "", error_msg
     
+    def _is_safe_member(self, member: tarfile.TarInfo) -> bool:
+        """
+        检查tar成员是否可以安全解压
+        
+        输入：
+        - member: tar包中的成员信息
+        
+        输出：
+        - is_safe: 是否可以解压（布尔值）
+        
+        这个函数防止路径遍历攻击，跳过链接和过大的文件
+        """
+        return self._is_safe_entry(member.name, member.size, member.issym() or member.islnk())
+    
+    def _is_safe_entry(self, name: str, size: int, is_link: bool) -> bool:
+        """
+        按名称、大小和类型检查压缩包条目是否可以安全解压（tarfile和libarchive共用）
+        
+        输入：
+        - name: 条目路径，如 "figs/a.png"
+        - size: 条目大小（字节）
+        - is_link: 是否为符号链接或硬链接
+        
+        输出：
+        - is_safe: 是否可以解压（布尔值）
+        """
+        # 检查路径
+        if name.startswith('/') or '..' in name.split('/'):
+            return False
+        # 符号链接和硬链接可能指向解压目录之外
+        if is_link:
+            logger.warning("跳过链接文件: %s", name)
+            return False
+        # 检查文件大小 (限制单个文件最大100MB)
+        if size > 100 * 1024 * 1024:
+            logger.warning("跳过过大文件: %s (%s bytes)", name, size)
+            return False
+        return True
+    
+    def _extract_with_libarchive(self, tar_path: str, extract_path: Path) -> int:
+        """
+        用libarchive（C实现）解压tar包
+        
+        输入：
+        - tar_path: tar文件路径
+        - extract_path: 解压目录路径
+        
+        输出：
+        - extracted_count: 成功解压的文件数
+        
+        这个函数逐个检查条目路径后再写出数据块，解压和解压缩都在C中完成，
+        只处理目录和普通文件
+        """
+        extracted_count = 0
+        with libarchive.file_reader(str(tar_path)) as archive:
+            for entry in archive:
+                name = entry.pathname.rstrip('/')
+                if not name or not self._is_safe_entry(name, entry.size or 0, entry.issym or entry.islnk):
+                    continue
+                
+                target = extract_path / name
+                if entry.isdir:
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+                if not entry.isfile:
+                    continue
+                
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(target, 'wb') as f:
+                    for block in entry.get_blocks():
+                        f.write(block)
+                extracted_count += 1
+        return extracted_count
+    
+    def _finish_extract(self, arxiv_id: str, extract_path: Path, extracted_count: int,
+                        source_url: str = "") -> Tuple[bool, str, str]:
+        """
+        检查解压结果、处理文件夹包装并写入缓存索引
+        
+        输入：
+        - arxiv_id: arxiv ID，如 "1812.10695"
+        - extract_path: 临时解压目录，如 "./arxiv_cache/1812.10695/extract.tmp"，成功后改名为 extract
+        - extracted_count: 成功解压的文件数
+        - source_url: 下载地址（写入缓存索引）
+        
+        输出：解压结果元组
+        - success: 是否成功（布尔值）
+        - extract_path: 最终的源码目录路径（字符串）
+        - error_msg: 错误信息（字符串）
+        """
+        # 一次遍历统计所有文件、tex文件和其他文档文件
+        files_by_ext = _scan_tree(extract_path)
+        total_count = sum(len(paths) for paths in files_by_ext.values())
+        tex_count = len(files_by_ext.get('tex', ()))
+        doc_count = sum(len(files_by_ext.get(ext, ())) for ext in ('pdf', 'ps', 'dvi'))
+        
+        logger.info("解压完成: 成功解压 %s 个文件", extracted_count)
+        logger.info("发现文件: %s 个总文件", total_count)
+        logger.info("发现tex文件: %s 个", tex_count)
+        
+        if tex_count == 0:
+            # 检查是否有其他类型的文档文件
+            if doc_count > 0:
+                logger.warning("未找到tex文件，但找到 %s 个文档文件", doc_count)
+                # 对于只有PDF等文件的情况，也认为是成功的
+            else:
+                error_msg = f"解压后未找到tex或文档文件: {extract_path}"
+                logger.error(error_msg)
+                return False, "", error_msg
+        
+        # 写完成标记后把临时目录整体改名为正式的解压目录，旧目录（如果有）此时才删除
+        _write_extract_marker(extract_path, self._tar_sha256.get(arxiv_id))
+        final_root = self.cache_dir / arxiv_id / "extract"
+        if final_root.exists():
+            shutil.rmtree(final_root)
+        os.rename(extract_path, final_root)
+        
+        # 处理单层文件夹包装的情况
+        extract_path = self._handle_folder_wrapper(final_root)
+        
+        self._record_cache(arxiv_id, str(extract_path), source_url)
+        
+        return True, str(extract_path), ""
+    
+    def _extract_stream(self, fileobj, extract_path: Path) -> int:
+        """
+        从文件对象流式解压tar包
+        
+        输入：
+        - fileobj: 可读的文件对象，如HTTP响应的原始流
+        - extract_path: 解压目录路径
+        
+        输出：
+        - extracted_count: 成功解压的文件数
+        
+        这个函数以 'r|*' 流式模式顺序读取一遍，自动识别压缩格式
+        """
+        # bufsize为流式读取的块大小，copybufsize为每个成员写出时的拷贝块大小
+        with _ExtractTarFile.open(fileobj=fileobj, mode='r|*', bufsize=EXTRACT_BUFFER_SIZE,
+                                  copybufsize=EXTRACT_BUFFER_SIZE) as tar:
+            return self._extract_members(tar, extract_path)
+    
+    def _extract_members(self, tar: tarfile.TarFile, extract_path: Path) -> int:
+        """
+        顺序遍历tar成员，安全检查后用一次extractall解压
+        
+        输入：
+        - tar: 已打开的tar包（_ExtractTarFile）
+        - extract_path: 解压目录路径
+        
+        输出：
+        - extracted_count: 通过安全检查、交给extractall解压的文件数
+        
+        tarfile会把读过的成员头都留在tar.members里；链接成员本来就会被跳过，不需要回查，
+        所以生成器每取出一个成员就清空列表，解压大包时内存占用保持恒定。
+        errorlevel=0 让单个文件写出失败时跳过该文件继续解压；
+        支持解压过滤器的Python上再叠加 'data' 过滤器
+        """
+        extracted_count = 0
+        
+        def safe_members():
+            nonlocal extracted_count
+            while True:
+                member = tar.next()
+                if member is None:
+                    return
+                tar.members.clear()
+                if self._is_safe_member(member):
+                    extracted_count += 1
+                    yield member
+        
+        extract_kwargs = {}
+        if hasattr(tarfile, 'data_filter'):
+            extract_kwargs['filter'] = _logging_data_filter
+        
+        tar.errorlevel = 0
+        tar.extractall(path=extract_path, members=safe_members(), **extract_kwargs)
+        return extracted_count
+    
+    def download_and_extract_streaming(self, arxiv_id: str) -> Tuple[bool, str, str]:
+        """
+        流式下载并解压arxiv源码包（不落盘tar文件）
+        
+        输入：
+        - arxiv_id: 标准化的arxiv ID，如 "1812.10695"
+        
+        输出：解压结果元组
+        - success: 是否成功（布尔值）
+        - extract_path: 解压目录路径（字符串）
+        - error_msg: 错误信息（字符串）
+        
+        这个函数把HTTP响应直接交给tarfile的流式模式，边下载边解压，
+        省掉写入再读回tar文件的磁盘开销；网络读取在单独的线程中进行，下载和解压互相重叠；
+        每个镜像源只尝试一次，失败后由调用方回退到落盘下载；所有镜像源都返回404时
+        error_msg 为 NOT_FOUND_ERROR，调用方不必回退
+        """
+        extract_path = self.cache_dir / arxiv_id / "extract.tmp"
+        last_error = ""
+        mirrors = self._available_mirrors()
+        not_found_count = 0
+        
+        for attempt, (mirror_idx, mirror_base) in enumerate(mirrors):
+            download_url = f"{mirror_base}{arxiv_id}"
+            
+            try:
+                if attempt > 0:
+                    self._add_random_delay(0.5, 1.5)
+                
+                # 解压到临时目录，清理之前残留的临时目录
+                if extract_path.exists():
+                    shutil.rmtree(extract_path)
+                extract_path.mkdir(parents=True, exist_ok=True)
+                
+                logger.info("流式下载镜像源 %s: %s", mirror_idx + 1, download_url)
+                
+                _wait_for_token(download_url)
+                with _host_slot(download_url), self.session.get(
+                    download_url,
+                    timeout=self.timeout,
+                    headers=self._get_random_headers(),
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    self._record_mirror_result(mirror_base, True, response.elapsed.total_seconds())
+                    response.raw.decode_content = True
+                    
+                    # 生产者线程负责网络读取和计算摘要，当前线程同时解压，两边通过有界队列衔接
+                    hasher = hashlib.sha256()
+                    chunks = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+                    stop_event = threading.Event()
+                    producer = threading.Thread(
+                        target=_pump_stream,
+                        args=(response.raw, chunks, hasher, stop_event),
+                        daemon=True
+                    )
+                    producer.start()
+                    
+                    reader = _QueueReader(chunks)
+                    try:
+                        extracted_count = self._extract_stream(reader, extract_path)
+                        # tarfile读到结束标记就停止，把剩余的填充数据读完，保证摘要覆盖整个文件
+                        while reader.read(DOWNLOAD_BUFFER_SIZE):
+                            pass
+                    finally:
+                        stop_event.set()
+                    # 读到结束标记说明生产者已经处理完所有数据，摘要是完整的
+                    self._tar_sha256[arxiv_id] = hasher.hexdigest()
+                
+                success, final_path, error_msg = self._finish_extract(
+                    arxiv_id, extract_path, extracted_count, download_url
+                )
+                if success:
+                    return True, final_path, ""
+                last_error = error_msg
+                
+            except Exception as e:
+                if isinstance(e, requests.exceptions.HTTPError):
+                    self._cool_down_mirror(mirror_base, e.response.status_code, e.response.headers)
+                    if e.response.status_code != 404:
+                        self._record_mirror_result(mirror_base, False)
+                    else:
+                        not_found_count += 1
+                elif isinstance(e, requests.exceptions.RequestException):
+                    self._record_mirror_result(mirror_base, False)
+                last_error = f"流式下载解压失败: {e}"
+                logger.warning("镜像源 %s 流式下载解压失败: %s", mirror_idx + 1, e)
+        
+        # 失败时清理临时解压目录
+        if extract_path.exists():
+            shutil.rmtree(extract_path, ignore_errors=True)
+        
+        if mirrors and not_found_count == len(mirrors):
+            return False, "", NOT_FOUND_ERROR
+        return False, "", last_error
+    
     def _handle_folder_wrapper(self, extract_path: Path) -> Path:
         """
         处理单层文件夹包装的情况 (增强版)
@@ -513,31 +2210,26 @@ class ArxivDownloader:
         这个函数处理arxiv源码被包装在单个文件夹中的情况
         """
         try:
-            items = list(extract_path.iterdir())
-            # 过滤掉系统文件夹
-            items = [item for item in items if item.name not in ['__MACOSX', '.DS_Store', 'Thumbs.db']]
-            
-            # 如果只有一个文件夹，且没有重要文件在根目录
-            if len(items) == 1 and items[0].is_dir():
-                root_important_files = list(extract_path.glob("*.tex")) + \
-                                     list(extract_path.glob("*.pdf")) + \
-                                     list(extract_path.glob("*.bib")) + \
-                                     list(extract_path.glob("*.cls")) + \
-                                     list(extract_path.glob("*.sty"))
-                
-                if len(root_important_files) == 0:
-                    subfolder = items[0]
-                    subfolder_important_files = list(subfolder.glob("**/*.tex")) + \
-                                              list(subfolder.glob("**/*.pdf"))
-                    
-                    if len(subfolder_important_files) > 0:
-                        logger.info(f"检测到文件夹包装，使用子文件夹: {subfolder}")
-                        return subfolder
+            # 过滤掉系统文件夹，只需要知道是否恰好有一个子文件夹
+            subfolder = None
+            with os.scandir(extract_path) as it:
+                for entry in it:
+                    if entry.name in ('__MACOSX', '.DS_Store', 'Thumbs.db', EXTRACT_DONE_MARKER):
+                        continue
+                    if subfolder is not None or not entry.is_dir():
+                        # 根目录下有多个条目或有文件，不是包装文件夹
+                        return extract_path
+                    subfolder = entry.path
+            
+            # 子文件夹中找到第一个tex或pdf文件就确认
+            if subfolder is not None and _has_tex(subfolder, suffixes=('.tex', '.pdf'))[0]:
+                logger.info("检测到文件夹包装，使用子文件夹: %s", subfolder)
+                return Path(subfolder)
             
             return extract_path
             
         except Exception as e:
-            logger.warning(f"处理文件夹包装时出错: {e}")
+            logger.warning("处理文件夹包装时出错: %s", e)
             return extract_path
     
     def download_and_extract(self, arxiv_input: str, use_cache: bool = True) -> Tuple[bool, str, str]:
@@ -555,69 +2247,53 @@ class ArxivDownloader:
         
         这个函数是主要的公共接口，完成从输入到解压的完整流程，支持重试和错误恢复
         """
-        print("=" * 60)
-        print("开始Arxiv论文下载和解压 (增强版)")
-        print("=" * 60)
-        
         start_time = time.time()
         
         # Step 1: 解析输入
-        print(f"Step 1: 解析arxiv输入...")
         success, arxiv_id, error_msg = self.parse_arxiv_input(arxiv_input)
         if not success:
             return False, "", f"输入解析失败: {error_msg}"
         
-        print(f"✓ 解析成功，arxiv ID: {arxiv_id}")
+        logger.info("开始下载arxiv论文: %s", arxiv_id)
         
         # Step 2: 检查缓存
         if use_cache:
-            print(f"Step 2: 检查缓存...")
             cache_path = self.check_cache(arxiv_id)
             if cache_path:
-                elapsed_time = time.time() - start_time
-                print(f"✓ 找到缓存，直接使用: {cache_path}")
-                print(f"✓ 总耗时: {elapsed_time:.2f} 秒")
+                logger.info("使用缓存: %s (耗时 %.2f 秒)", cache_path, time.time() - start_time)
                 return True, cache_path, f"使用缓存: {cache_path}"
-            print("✓ 未找到缓存，需要下载")
-        else:
-            print("Step 2: 跳过缓存检查")
-        
-        # Step 3: 下载源码包 (带重试)
-        print(f"Step 3: 下载源码包 (最多重试 {self.max_retries} 次)...")
-        success, tar_path, error_msg = self.download_arxiv_source(arxiv_id)
-        if not success:
-            return False, "", f"下载失败: {error_msg}"
         
-        download_time = time.time() - start_time
-        print(f"✓ 下载成功: {tar_path}")
-        print(f"✓ 下载耗时: {download_time:.2f} 秒")
+        extract_path = ""
         
-                # Step 4: 解压文件
-        print(f"Step 4: 解压文件...")
-        success, extract_path, error_msg = self.extract_tar_file(tar_path, arxiv_id)
-        if not success:
-            return False, "", f"解压失败: {error_msg}"
-        
-        extract_time = time.time() - start_time
-        print(f"✓ 解压成功: {extract_path}")
-        print(f"✓ 解压耗时: {extract_time - download_time:.2f} 秒")
+        # Step 3: 缓存未命中时优先流式下载解压，不落盘tar文件
+        if use_cache and not self.keep_tar:
+            success, extract_path, error_msg = self.download_and_extract_streaming(arxiv_id)
+            if not success and error_msg == NOT_FOUND_ERROR:
+                # 论文不存在，落盘下载同样会得到404，不再回退
+                return False, "", f"下载失败: {error_msg}"
+            if not success:
+                logger.warning("流式下载解压失败，改用落盘下载: %s", error_msg)
+                extract_path = ""
         
-        # 统计结果
-        tex_files = list(Path(extract_path).glob("**/*.tex"))
-        pdf_files = list(Path(extract_path).glob("**/*.pdf"))
-        bib_files = list(Path(extract_path).glob("**/*.bib"))
-        all_files = list(Path(extract_path).glob("**/*"))
-        
-        print(f"✓ 文件统计:")
-        print(f"  - 总文件数: {len(all_files)}")
-        print(f"  - tex文件: {len(tex_files)}")
-        print(f"  - pdf文件: {len(pdf_files)}")
-        print(f"  - bib文件: {len(bib_files)}")
+        if not extract_path:
+            # Step 3: 下载源码包 (带重试)
+            success, tar_path, error_msg = self.download_arxiv_source(arxiv_id)
+            if not success:
+                return False, "", f"下载失败: {error_msg}"
+            
+            # Step 4: 解压文件
+            success, extract_path, error_msg = self.extract_tar_file(tar_path, arxiv_id)
+            if not success:
+                return False, "", f"解压失败: {error_msg}"
         
-        total_time = time.time() - start_time
-        print("=" * 60)
-        print(f"Arxiv论文下载完成 (总耗时: {total_time:.2f} 秒)")
-        print("=" * 60)
+        # 统计结果：一次遍历同时计数
+        files_by_ext = _scan_tree(extract_path)
+        logger.info(
+            "arxiv论文下载完成: %s (总文件 %d, tex %d, pdf %d, bib %d, 总耗时 %.2f 秒)",
+            extract_path, sum(len(paths) for paths in files_by_ext.values()),
+            len(files_by_ext.get('tex', ())), len(files_by_ext.get('pdf', ())),
+            len(files_by_ext.get('bib', ())), time.time() - start_time
+        )
         
         return True, extract_path, f"下载解压成功: {extract_path}"
     
@@ -637,9 +2313,11 @@ class ArxivDownloader:
                 cache_path = self.cache_dir / arxiv_id
                 if cache_path.exists():
                     shutil.rmtree(cache_path)
-                    logger.info(f"已清理缓存: {arxiv_id}")
+                    self._forget_cache(arxiv_id)
+                    self._prune_blobs()
+                    logger.info("已清理缓存: %s", arxiv_id)
                 else:
-                    logger.info(f"缓存不存在: {arxiv_id}")
+                    logger.info("缓存不存在: %s", arxiv_id)
             else:
                 # 清理过期缓存
                 import time
@@ -647,15 +2325,19 @@ class ArxivDownloader:
                 cleaned_count = 0
                 
                 for item in self.cache_dir.iterdir():
+                    if item.name in _NON_PAPER_DIRS:
+                        continue
                     if item.is_dir() and item.stat().st_mtime < cutoff_time:
                         shutil.rmtree(item)
+                        self._forget_cache(item.name)
                         cleaned_count += 1
-                        logger.info(f"已清理过期缓存: {item.name}")
+                        logger.info("已清理过期缓存: %s", item.name)
                 
-                logger.info(f"清理完成，共清理 {cleaned_count} 个过期缓存")
+                self._prune_blobs()
+                logger.info("清理完成，共清理 %s 个过期缓存", cleaned_count)
                 
         except Exception as e:
-            logger.error(f"清理缓存时出错: {e}")
+            logger.error("清理缓存时出错: %s", e)
     
     def get_cache_info(self) -> dict:
         """
@@ -679,7 +2361,7 @@ class ArxivDownloader:
             
             total_size = 0
             for item in self.cache_dir.iterdir():
-                if item.is_dir():
+                if item.is_dir() and item.name not in _NON_PAPER_DIRS:
                     paper_info = {
                         "arxiv_id": item.name,
                         "has_extract": (item / "extract").exists(),
@@ -688,12 +2370,7 @@ class ArxivDownloader:
                     }
                     
                     # 计算大小
-                    for root, dirs, files in os.walk(item):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            paper_info["size_mb"] += os.path.getsize(file_path)
-                    
-                    paper_info["size_mb"] = paper_info["size_mb"] / (1024 * 1024)  # 转换为MB
+                    paper_info["size_mb"] = _paper_dir_size(item) / (1024 * 1024)  # 转换为MB
                     total_size += paper_info["size_mb"]
                     
                     info["papers"].append(paper_info)
@@ -704,7 +2381,7 @@ class ArxivDownloader:
             return info
             
         except Exception as e:
-            logger.error(f"获取缓存信息时出错: {e}")
+            logger.error("获取缓存信息时出错: %s", e)
             return {"error": str(e)}
 
 def download_arxiv_paper(arxiv_input: str, cache_dir: str = "./arxiv_cache", 
@@ -726,12 +2403,12 @@ def download_arxiv_paper(arxiv_input: str, cache_dir: str = "./arxiv_cache",
     
     这个函数提供最简单的调用方式，一步完成arxiv论文的下载和解压
     """
-    downloader = ArxivDownloader(
+    with ArxivDownloader(
         cache_dir=cache_dir, 
         proxies=proxies, 
         max_retries=max_retries
-    )
-    success, extract_path, message = downloader.download_and_extract(arxiv_input, use_cache)
+    ) as downloader:
+        success, extract_path, message = downloader.download_and_extract(arxiv_input, use_cache)
     
     if success:
         return True, extract_path
@@ -740,7 +2417,8 @@ def download_arxiv_paper(arxiv_input: str, cache_dir: str = "./arxiv_cache",
 
 def batch_download_arxiv_papers(arxiv_list: List[str], cache_dir: str = "./arxiv_cache",
                                proxies: dict = None, max_retries: int = 3,
-                               delay_between_downloads: float = 2.0) -> dict:
+                               delay_between_downloads: float = 2.0,
+                               max_workers: int = 4) -> dict:
     """
     批量下载arxiv论文
     
@@ -749,12 +2427,14 @@ def batch_download_arxiv_papers(arxiv_list: List[str], cache_dir: str = "./arxiv
     - cache_dir: 缓存目录
     - proxies: 代理配置
     - max_retries: 最大重试次数
-    - delay_between_downloads: 下载间隔时间（秒）
+    - delay_between_downloads: 相邻两篇论文开始下载的间隔时间（秒）
+    - max_workers: 并发下载的线程数，默认4
     
     输出：
     - results: 批量下载结果字典
     
-    这个函数支持批量下载多篇论文，自动管理下载间隔
+    这个函数用线程池并发下载多篇论文，网络读取和解压时线程会释放GIL；
+    每个镜像主机同时最多 MAX_DOWNLOADS_PER_HOST 个下载，同一篇论文只下载一次
     """
     results = {
         "total": len(arxiv_list),
@@ -769,61 +2449,216 @@ def batch_download_arxiv_papers(arxiv_list: List[str], cache_dir: str = "./arxiv
         max_retries=max_retries
     )
     
-    print(f"开始批量下载 {len(arxiv_list)} 篇论文...")
+    print(f"开始批量下载 {len(arxiv_list)} 篇论文 (并发数 {max_workers})...")
     print("=" * 60)
     
-    for i, arxiv_input in enumerate(arxiv_list, 1):
-        print(f"\n进度: {i}/{len(arxiv_list)} - {arxiv_input}")
-        print("-" * 40)
+    downloader.prewarm_connections()
+    
+    # 同一篇论文的不同写法（ID、abs链接、pdf链接）共用一个任务，避免多个线程写同一个缓存目录
+    futures = {}
+    inputs_by_future = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for arxiv_input in arxiv_list:
+            success, arxiv_id, _ = downloader.parse_arxiv_input(arxiv_input)
+            key = arxiv_id if success else arxiv_input
+            if key not in futures:
+                # 错开各篇论文的开始时间，避免同时向镜像源发起大量请求
+                if futures and delay_between_downloads > 0:
+                    time.sleep(delay_between_downloads)
+                futures[key] = executor.submit(downloader.download_and_extract, arxiv_input)
+                inputs_by_future[futures[key]] = []
+            inputs_by_future[futures[key]].append(arxiv_input)
         
-        try:
-            success, extract_path, message = downloader.download_and_extract(arxiv_input)
-            
-            result_detail = {
-                "arxiv_input": arxiv_input,
-                "success": success,
-                "extract_path": extract_path if success else "",
-                "message": message
-            }
-            
-            results["details"].append(result_detail)
+        done_count = 0
+        for future in as_completed(inputs_by_future):
+            try:
+                success, extract_path, message = future.result()
+            except Exception as e:
+                success, extract_path, message = False, "", f"批量下载异常: {e}"
             
-            if success:
-                results["success"] += 1
-                print(f"✅ 成功: {extract_path}")
-            else:
-                results["failed"] += 1
-                print(f"❌ 失败: {message}")
+            for arxiv_input in inputs_by_future[future]:
+                done_count += 1
+                results["details"].append({
+                    "arxiv_input": arxiv_input,
+                    "success": success,
+                    "extract_path": extract_path if success else "",
+                    "message": message
+                })
                 
-        except KeyboardInterrupt:
-            print("\n用户中断批量下载")
-            break
-        except Exception as e:
-            results["failed"] += 1
-            error_msg = f"批量下载异常: {e}"
-            results["details"].append({
-                "arxiv_input": arxiv_input,
-                "success": False,
-                "extract_path": "",
-                "message": error_msg
-            })
-            print(f"❌ 异常: {error_msg}")
-        
-        # 添加下载间隔（最后一个不需要等待）
-        if i < len(arxiv_list):
-            print(f"等待 {delay_between_downloads} 秒...")
-            time.sleep(delay_between_downloads)
+                if success:
+                    results["success"] += 1
+                    print(f"✅ [{done_count}/{len(arxiv_list)}] {arxiv_input} 成功: {extract_path}")
+                else:
+                    results["failed"] += 1
+                    print(f"❌ [{done_count}/{len(arxiv_list)}] {arxiv_input} 失败: {message}")
+    
+    except KeyboardInterrupt:
+        print("\n用户中断批量下载")
+        for future in inputs_by_future:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=True)
+        downloader.close()
     
     print("\n" + "=" * 60)
     print(f"批量下载完成:")
     print(f"  总数: {results['total']}")
     print(f"  成功: {results['success']}")
     print(f"  失败: {results['failed']}")
-    print(f"  成功率: {results['success']/results['total']*100:.1f}%")
+    print(f"  成功率: {results['success']/max(results['total'], 1)*100:.1f}%")
     print("=" * 60)
     
     return results
 
+class _AsyncStreamReader:
+    """
+    把aiohttp的StreamReader包装成同步文件对象
+    
+    tarfile只支持同步读取，解压在线程池中进行，每次read都提交回事件循环执行
+    """
+    
+    def __init__(self, stream, loop):
+        self._stream = stream
+        self._loop = loop
+    
+    def read(self, size: int = -1) -> bytes:
+        future = asyncio.run_coroutine_threadsafe(self._stream.read(size), self._loop)
+        return future.result()
+
+
+async def _download_one_async(downloader: ArxivDownloader, session, semaphore: asyncio.Semaphore,
+                              arxiv_input: str, proxy: Optional[str]) -> dict:
+    """
+    异步下载并解压单篇论文
+    
+    输入：
+    - downloader: 下载器实例，提供解析、缓存和解压功能
+    - session: 共享的aiohttp.ClientSession
+    - semaphore: 限制并发数的信号量
+    - arxiv_input: arxiv ID或URL
+    - proxy: 代理地址，如 "http://127.0.0.1:7890"
+    
+    输出：
+    - result_detail: 单篇论文的结果字典
+    """
+    result_detail = {
+        "arxiv_input": arxiv_input,
+        "success": False,
+        "extract_path": "",
+        "message": ""
+    }
+    
+    success, arxiv_id, error_msg = downloader.parse_arxiv_input(arxiv_input)
+    if not success:
+        result_detail["message"] = f"输入解析失败: {error_msg}"
+        return result_detail
+    
+    # 缓存检查会读写sqlite索引、遍历目录，放到线程池，不阻塞其他论文的下载
+    loop = asyncio.get_running_loop()
+    cache_path = await loop.run_in_executor(None, downloader.check_cache, arxiv_id)
+    if cache_path:
+        result_detail.update(success=True, extract_path=cache_path, message=f"使用缓存: {cache_path}")
+        return result_detail
+    
+    extract_path = downloader.cache_dir / arxiv_id / "extract.tmp"
+    last_error = ""
+    
+    async with semaphore:
+        for mirror_idx, mirror_base in downloader._available_mirrors():
+            download_url = f"{mirror_base}{arxiv_id}"
+            try:
+                if extract_path.exists():
+                    shutil.rmtree(extract_path)
+                extract_path.mkdir(parents=True, exist_ok=True)
+                
+                logger.info("异步下载镜像源 %s: %s", mirror_idx + 1, download_url)
+                delay = _host_bucket(download_url).reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                
+                request_start = time.monotonic()
+                async with session.get(download_url, headers=downloader._get_random_headers(),
+                                       proxy=proxy) as response:
+                    response.raise_for_status()
+                    downloader._record_mirror_result(mirror_base, True, time.monotonic() - request_start)
+                    # 解压放到线程池，读取数据仍然在事件循环中进行
+                    reader = _AsyncStreamReader(response.content, loop)
+                    extracted_count = await loop.run_in_executor(
+                        None, downloader._extract_stream, reader, extract_path
+                    )
+                
+                # 收尾涉及目录重命名、扫描和写入缓存索引，同样放到线程池
+                success, final_path, error_msg = await loop.run_in_executor(
+                    None, downloader._finish_extract, arxiv_id, extract_path, extracted_count, download_url
+                )
+                if success:
+                    result_detail.update(success=True, extract_path=final_path,
+                                         message=f"下载解压成功: {final_path}")
+                    return result_detail
+                last_error = error_msg
+                
+            except Exception as e:
+                if isinstance(e, aiohttp.ClientResponseError):
+                    downloader._cool_down_mirror(mirror_base, e.status, e.headers)
+                    if e.status != 404:
+                        downloader._record_mirror_result(mirror_base, False)
+                elif isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    downloader._record_mirror_result(mirror_base, False)
+                last_error = f"异步下载解压失败: {e}"
+                logger.warning("镜像源 %s 异步下载解压失败: %s", mirror_idx + 1, e)
+    
+    if extract_path.exists():
+        shutil.rmtree(extract_path, ignore_errors=True)
+    result_detail["message"] = last_error
+    return result_detail
+
+
+async def download_arxiv_papers(inputs: List[str], cache_dir: str = "./arxiv_cache",
+                                proxies: dict = None, max_concurrent: int = 5) -> dict:
+    """
+    异步并发批量下载arxiv论文
+    
+    输入：
+    - inputs: arxiv ID或URL列表，如 ["1812.10695", "https://arxiv.org/abs/2402.14207"]
+    - cache_dir: 缓存目录
+    - proxies: 代理配置，如 {"https": "http://127.0.0.1:7890"}
+    - max_concurrent: 最大并发下载数，默认5
+    
+    输出：
+    - results: 批量下载结果字典，格式与 batch_download_arxiv_papers 相同
+    
+    这个函数用一个共享的aiohttp会话并发下载多篇论文，边下载边解压，
+    总耗时接近最慢的一篇而不是所有论文之和；未安装aiohttp时退回到顺序批量下载
+    """
+    if aiohttp is None:
+        logger.warning("未安装aiohttp，改用线程池批量下载")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(
+            batch_download_arxiv_papers, inputs, cache_dir=cache_dir, proxies=proxies,
+            max_workers=max_concurrent
+        ))
+    
+    with ArxivDownloader(cache_dir=cache_dir, proxies=proxies) as downloader:
+        proxy = downloader.proxies.get("https") or downloader.proxies.get("http")
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        connector = aiohttp.TCPConnector(limit=max_concurrent, limit_per_host=max_concurrent)
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=downloader.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            details = await asyncio.gather(*[
+                _download_one_async(downloader, session, semaphore, arxiv_input, proxy)
+                for arxiv_input in inputs
+            ])
+    
+    success_count = sum(1 for detail in details if detail["success"])
+    return {
+        "total": len(inputs),
+        "success": success_count,
+        "failed": len(inputs) - success_count,
+        "details": list(details)
+    }
+
 # 测试和示例代码
 def main():
     """
@@ -871,22 +2706,20 @@ def main():
             print(f"✅ 单个下载测试通过")
             print(f"解压路径: {extract_path}")
             
-            # 显示详细文件统计
-            path_obj = Path(extract_path)
-            tex_files = list(path_obj.glob("**/*.tex"))
-            pdf_files = list(path_obj.glob("**/*.pdf"))
-            bib_files = list(path_obj.glob("**/*.bib"))
+            # 显示详细文件统计：一次遍历按扩展名分类
+            files_by_ext = _scan_tree(extract_path)
+            tex_files = files_by_ext.get('tex', [])
             
             print(f"文件详情:")
             print(f"  - tex文件: {len(tex_files)}")
-            print(f"  - pdf文件: {len(pdf_files)}")  
-            print(f"  - bib文件: {len(bib_files)}")
+            print(f"  - pdf文件: {len(files_by_ext.get('pdf', ()))}")  
+            print(f"  - bib文件: {len(files_by_ext.get('bib', ()))}")
             
             if tex_files:
                 print(f"主要tex文件:")
                 for tex_file in tex_files[:3]:
-                    rel_path = tex_file.relative_to(path_obj)
-                    size_kb = tex_file.stat().st_size // 1024
+                    rel_path = os.path.relpath(tex_file, extract_path)
+                    size_kb = os.path.getsize(tex_file) // 1024
                     print(f"    - {rel_path} ({size_kb}KB)")
         else:
             print(f"❌ 单个下载测试失败: {message}")
@@ -894,21 +2727,18 @@ def main():
     except Exception as e:
         print(f"❌ 单个下载测试异常: {e}")
     
-    # 测试批量下载
+    # 测试并发批量下载
     print(f"\n" + "="*50)
-    print("测试批量下载功能")
+    print("测试并发批量下载功能")
     print("="*50)
     
-    batch_test_cases = test_cases[:2]  # 只测试前2个，避免测试时间过长
-    
     try:
-        results = batch_download_arxiv_papers(
-            arxiv_list=batch_test_cases,
+        results = asyncio.run(download_arxiv_papers(
+            test_cases,
             cache_dir="./test_arxiv_cache",  # 测试时使用独立目录
             proxies=proxies,
-            max_retries=2,  # 测试时减少重试次数
-            delay_between_downloads=1.0  # 测试时减少等待时间
-        )
+            max_concurrent=5
+        ))
         
         print(f"\n批量下载结果:")
         for detail in results["details"]:
@@ -17,11 +17,24 @@ LaTeX内容智能切分器（完整版）
 """
 
 import re
+import hashlib
 import logging
+import threading
 import numpy as np
-from typing import List, Tuple, Dict, Optional, Any
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Optional, Any, NamedTuple
 from pathlib import Path
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -33,6 +46,214 @@ logger = logging.getLogger(__name__)
 PRESERVE = 0    # 保护区域，不进行翻译
 TRANSFORM = 1   # 转换区域，需要翻译
 
+# 保护掩码缓存：文档内容哈希 -> 掩码，所有切分器实例共享
+MASK_CACHE_SIZE = 32
+_MASK_CACHE = OrderedDict()
+_MASK_CACHE_LOCK = threading.Lock()
+
+def _compile(pattern, flags=0, linear=False):
+    """
+    编译保护规则用的正则表达式
+
+    输入：
+    - pattern: 正则表达式字符串、字符串列表或已编译的Pattern
+    - flags: 正则表达式标志，如 re.DOTALL
+    - linear: 是否优先使用RE2（线性时间引擎），如 True
+
+    输出：
+    - pattern: 编译后的Pattern对象
+
+    已编译的Pattern原样返回，列表先用"|"拼接再编译。
+    安装了re2时，像 \begin{figure} 缺少对应 \end 这样的输入不会让 .*? 规则反复扫到文末
+    """
+    if not isinstance(pattern, (str, list)):
+        return pattern
+    if isinstance(pattern, list):
+        pattern = "|".join(pattern)
+    if linear and re2 is not None and not flags & ~re.DOTALL:
+        try:
+            # 标志写成内联形式，不依赖re2模块的标志常量
+            return re2.compile(("(?s)" if flags & re.DOTALL else "") + pattern)
+        except Exception as e:
+            logger.warning(f"re2无法编译规则，改用re: {pattern[:50]} ({e})")
+    return re.compile(pattern, flags)
+
+# 切分时用到的全部保护规则：(正则表达式或分支列表, 标志)
+_PATTERN_SOURCES = {
+    # 第一阶段：基础保护
+    'before_maketitle': (r"^(.*?)\\maketitle", re.DOTALL),
+    'before_document': (r"^(.*?)\\begin{document}", re.DOTALL),
+    'iffalse': (r"\\iffalse(.*?)\\fi", re.DOTALL),
+    # 第二阶段：环境保护
+    'begin_end': (r"\\begin\{([a-z\*]*)\}(.*?)\\end\{\1\}", re.DOTALL),
+    'display_math': ([r"\$\$([^$]+)\$\$", r"\\\[.*?\\\]"], re.DOTALL),
+    # 第三阶段：章节和命令保护
+    'sections': ([
+        r"\\section\{(.*?)\}",
+        r"\\section\*\{(.*?)\}",
+        r"\\subsection\{(.*?)\}",
+        r"\\subsubsection\{(.*?)\}"
+    ], 0),
+    'bibliography': ([
+        r"\\bibliography\{(.*?)\}",
+        r"\\bibliographystyle\{(.*?)\}"
+    ], 0),
+    'thebibliography': (r"\\begin\{thebibliography\}.*?\\end\{thebibliography\}", re.DOTALL),
+    # 第四阶段：特殊环境保护
+    'lstlisting': (r"\\begin\{lstlisting\}(.*?)\\end\{lstlisting\}", re.DOTALL),
+    'algorithm': (r"\\begin\{algorithm\}(.*?)\\end\{algorithm\}", re.DOTALL),
+    'wraptable': (r"\\begin\{wraptable\}(.*?)\\end\{wraptable\}", re.DOTALL),
+    'wrapfigure': ([
+        r"\\begin\{wrapfigure\}(.*?)\\end\{wrapfigure\}",
+        r"\\begin\{wrapfigure\*\}(.*?)\\end\{wrapfigure\*\}"
+    ], re.DOTALL),
+    'figure': ([
+        r"\\begin\{figure\}(.*?)\\end\{figure\}",
+        r"\\begin\{figure\*\}(.*?)\\end\{figure\*\}"
+    ], re.DOTALL),
+    'table': ([
+        r"\\begin\{table\}(.*?)\\end\{table\}",
+        r"\\begin\{table\*\}(.*?)\\end\{table\*\}"
+    ], re.DOTALL),
+    'multline': ([
+        r"\\begin\{multline\}(.*?)\\end\{multline\}",
+        r"\\begin\{multline\*\}(.*?)\\end\{multline\*\}"
+    ], re.DOTALL),
+    'align': ([
+        r"\\begin\{align\*\}(.*?)\\end\{align\*\}",
+        r"\\begin\{align\}(.*?)\\end\{align\}"
+    ], re.DOTALL),
+    'equation': ([
+        r"\\begin\{equation\}(.*?)\\end\{equation\}",
+        r"\\begin\{equation\*\}(.*?)\\end\{equation\*\}"
+    ], re.DOTALL),
+    'minipage': ([
+        r"\\begin\{minipage\}(.*?)\\end\{minipage\}",
+        r"\\begin\{minipage\*\}(.*?)\\end\{minipage\*\}"
+    ], re.DOTALL),
+    # 第五阶段：杂项命令保护
+    'misc_commands': ([
+        r"\\includepdf\[(.*?)\]\{(.*?)\}",
+        r"\\clearpage",
+        r"\\newpage",
+        r"\\appendix",
+        r"\\tableofcontents",
+        r"\\include\{(.*?)\}"
+    ], 0),
+    'layout_commands': ([
+        r"\\vspace\{(.*?)\}",
+        r"\\hspace\{(.*?)\}",
+        r"\\label\{(.*?)\}",
+        r"\\begin\{(.*?)\}",
+        r"\\end\{(.*?)\}",
+        r"\\item "
+    ], 0),
+    'hl': (r"\\hl\{(.*?)\}", re.DOTALL),
+    # 第六阶段：反向操作
+    'caption': (r"\\caption\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL),
+    'abstract_cmd': (r"\\abstract\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL),
+    'abstract_env': (r"\\begin\{abstract\}(.*?)\\end\{abstract\}", re.DOTALL),
+    'title': (r"\\title\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL),
+    'author': (r"\\author\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL),
+}
+
+# begin_end 规则用到反向引用，RE2不支持，只能用回溯引擎
+_BACKTRACKING_ONLY = {'begin_end'}
+
+# 导入时编译一次，避免每次切分重复编译
+_PATTERNS = {
+    key: _compile(source, flags, linear=key not in _BACKTRACKING_ONLY)
+    for key, (source, flags) in _PATTERN_SOURCES.items()
+}
+
+# str.split()视为空白的全部码位，用于在码位数组上复现按空白分词
+_WHITESPACE_TABLE = np.zeros(0x3001, dtype=np.bool_)
+_WHITESPACE_TABLE[[
+    0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x1c, 0x1d, 0x1e, 0x1f, 0x20, 0x85, 0xa0,
+    0x1680, 0x2000, 0x2001, 0x2002, 0x2003, 0x2004, 0x2005, 0x2006, 0x2007,
+    0x2008, 0x2009, 0x200a, 0x2028, 0x2029, 0x202f, 0x205f, 0x3000,
+]] = True
+
+def _count_tokens_kernel(codes, whitespace):
+    """
+    在码位数组上一次扫描统计英文词数和中文字符数
+    
+    输入：
+    - codes: 文本的UTF-32码位数组（np.uint32）
+    - whitespace: 空白码位查找表，如 _WHITESPACE_TABLE
+    
+    输出：
+    - english_tokens: 按空白分隔的词数，与 len(txt.split()) 一致
+    - chinese_chars: 落在 0x4e00-0x9fff 区间的字符数
+    """
+    english_tokens = 0
+    chinese_chars = 0
+    in_word = False
+    table_size = whitespace.shape[0]
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        if 0x4e00 <= c <= 0x9fff:
+            chinese_chars += 1
+        if c < table_size and whitespace[c]:
+            in_word = False
+        elif not in_word:
+            in_word = True
+            english_tokens += 1
+    return english_tokens, chinese_chars
+
+# 安装了numba时把计数循环编译成机器码，并在导入时预热一次
+_count_tokens_nb = None
+if njit is not None:
+    try:
+        _count_tokens_nb = njit(cache=True)(_count_tokens_kernel)
+        _count_tokens_nb(np.zeros(1, dtype=np.uint32), _WHITESPACE_TABLE)
+    except Exception as e:
+        logger.warning(f"numba编译token计数函数失败，使用纯Python实现: {e}")
+        _count_tokens_nb = None
+
+# 统计中文字符时，超过这个长度改用numpy比较，较短的文本正则更快
+CJK_NUMPY_MIN_LENGTH = 128
+_CJK_CHAR_RE = re.compile(r'[\u4e00-\u9fff]')
+
+def _count_cjk_chars(txt):
+    """
+    统计 0x4e00-0x9fff 区间的中文字符数
+    
+    输入：
+    - txt: 文本内容，如 "你好 world"
+    
+    输出：
+    - count: 中文字符数（整数）
+    
+    纯ASCII文本直接返回0；长文本转成码位数组一次比较完成，不构造匹配列表
+    """
+    if txt.isascii():
+        return 0
+    if len(txt) >= CJK_NUMPY_MIN_LENGTH:
+        try:
+            codes = np.frombuffer(txt.encode('utf-32-le'), dtype=np.uint32)
+            return int(np.count_nonzero((codes >= 0x4e00) & (codes <= 0x9fff)))
+        except UnicodeEncodeError:
+            pass  # 含孤立代理字符，交给正则处理
+    return len(_CJK_CHAR_RE.findall(txt))
+
+def _get_token_num_py(txt):
+    """
+    纯Python的token估算，未安装numba时使用
+    
+    输入：
+    - txt: 文本内容，如 "Hello world"
+    
+    输出：
+    - token_count: 估算的token数量（整数）
+    """
+    # 简单但有效的估算方法
+    english_tokens = len(txt.split())
+    chinese_chars = _count_cjk_chars(txt)
+    # 为了安全起见，稍微高估一些
+    estimated_tokens = max(english_tokens, chinese_chars // 1.5)
+    return int(estimated_tokens * 1.2)  # 增加20%的安全边距
+
 def get_token_num(txt):
     """
     使用简单但快速的token估算方法
@@ -45,13 +266,78 @@ def get_token_num(txt):
     
     这个函数快速估算文本的token数量，避免下载tokenizer
     """
-    # 简单但有效的估算方法
-    english_tokens = len(txt.split())
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', txt))
+    if _count_tokens_nb is None:
+        return _get_token_num_py(txt)
+    try:
+        codes = np.frombuffer(txt.encode('utf-32-le'), dtype=np.uint32)
+    except UnicodeEncodeError:
+        # 含孤立代理字符时无法编码，退回纯Python实现
+        return _get_token_num_py(txt)
+    english_tokens, chinese_chars = _count_tokens_nb(codes, _WHITESPACE_TABLE)
     # 为了安全起见，稍微高估一些
-    estimated_tokens = max(english_tokens, chinese_chars // 1.5)
+    estimated_tokens = max(int(english_tokens), int(chinese_chars) // 1.5)
     return int(estimated_tokens * 1.2)  # 增加20%的安全边距
 
+def _range_token_counts(text, offsets):
+    """
+    一次性估算文本中连续多个区间的token数量
+    
+    输入：
+    - text: 文本内容，如 "Hello world. 你好。"
+    - offsets: 区间边界，如 [0, 13, 16]，表示 text[0:13] 和 text[13:16]
+    
+    输出：
+    - token_counts: 每个区间的估算token数量列表，与 get_token_num(text[a:b]) 相同
+    
+    这个函数把整段文本转成码位数组，用词首和中文字符的前缀和一次算出所有区间的结果
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if len(offsets) < 2:
+        return []
+    try:
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    except UnicodeEncodeError:
+        # 含孤立代理字符时无法编码，逐个区间计算
+        return [get_token_num(text[a:b]) for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    is_ws = np.zeros(len(codes), dtype=np.bool_)
+    in_table = codes < len(_WHITESPACE_TABLE)
+    is_ws[in_table] = _WHITESPACE_TABLE[codes[in_table]]
+    # 词首：自己不是空白，且前一个字符是空白
+    word_start = ~is_ws
+    word_start[1:] &= is_ws[:-1]
+    is_cjk = (codes >= 0x4e00) & (codes <= 0x9fff)
+
+    word_prefix = np.concatenate(([0], np.cumsum(word_start, dtype=np.int64)))
+    cjk_prefix = np.concatenate(([0], np.cumsum(is_cjk, dtype=np.int64)))
+
+    english_tokens = np.diff(word_prefix[offsets])
+    chinese_chars = np.diff(cjk_prefix[offsets])
+    # 区间从一个词的中间开始时，单独看这个区间它也是一个词
+    starts, ends = offsets[:-1], offsets[1:]
+    safe_starts = np.minimum(starts, max(len(codes) - 1, 0))
+    if len(codes):
+        english_tokens += (starts < ends) & ~is_ws[safe_starts] & ~word_start[safe_starts]
+    # 为了安全起见，稍微高估一些，与 get_token_num 的公式保持一致
+    estimated_tokens = np.maximum(english_tokens, chinese_chars // 1.5)
+    return (estimated_tokens * 1.2).astype(np.int64).tolist()
+
+def _line_token_counts(text):
+    """
+    一次性估算文本每一行的token数量
+    
+    输入：
+    - text: 多行文本内容，如 "Hello world\n你好"
+    
+    输出：
+    - token_counts: 每行的估算token数量列表，与 text.splitlines() 一一对应
+    
+    每行的值与 get_token_num(line) 相同
+    """
+    lines = text.splitlines(keepends=True)
+    offsets = np.concatenate(([0], np.cumsum([len(line) for line in lines])))
+    return _range_token_counts(text, offsets)
+
 class LinkedListNode:
     """
     链表节点类，用于管理LaTeX文档的片段
@@ -76,6 +362,134 @@ class LinkedListNode:
         self.next = None
         self.range = None
 
+def _literal_prefix(pattern):
+    """
+    提取正则表达式开头的字面量前缀
+    
+    输入：
+    - pattern: 正则表达式字符串，如 _PATTERNS['figure'] 的一个分支
+    
+    输出：
+    - prefix: 任何匹配都必须以它开头的字符串，如 "\\begin{figure}"
+    """
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break  # \d、\1 之类的转义不是字面量
+            literal, i = pattern[i + 1], i + 2
+        elif c in ".^$*+?{}[]|()":
+            break
+        else:
+            literal, i = c, i + 1
+        if i < len(pattern) and pattern[i] in "*+?{":
+            break  # 带量词的字符可有可无，不能算进前缀
+        prefix.append(literal)
+    return "".join(prefix)
+
+def _build_fused_scanner(pattern_keys):
+    """
+    把多条保护规则合并成一次扫描所需的数据
+    
+    输入：
+    - pattern_keys: _PATTERNS 中的规则名，如 ('sections', 'figure')
+    
+    输出：
+    - scanner: (前缀查找正则, 前缀到规则序号的映射, 规则Pattern列表)
+    
+    每条规则的每个分支都有固定的字面量前缀，先用一个零宽正则找出所有前缀出现的位置，
+    再只在这些位置上尝试对应的规则
+    """
+    # 规则在每个前缀位置上单独 match 一次，必须用re编译：re2的Python封装每次调用
+    # 都会把整段文本重新编码为UTF-8并从开头换算偏移，命中多时退化为 O(文本长度×命中数)
+    patterns = [_compile(*_PATTERN_SOURCES[key]) for key in pattern_keys]
+    prefixes_per_rule = []
+    for key in pattern_keys:
+        source, _ = _PATTERN_SOURCES[key]
+        branches = source if isinstance(source, list) else [source]
+        prefixes = [_literal_prefix(branch) for branch in branches]
+        if not all(prefixes):
+            raise ValueError(f"保护规则 {key} 没有字面量前缀，不能合并扫描")
+        prefixes_per_rule.append(prefixes)
+
+    all_prefixes = sorted({p for prefixes in prefixes_per_rule for p in prefixes}, key=len, reverse=True)
+    # 前缀按长度从长到短排列，命中的总是最长前缀；比它短且是它前缀的规则同样可能匹配
+    rules_for_prefix = {
+        hit: [index for index, prefixes in enumerate(prefixes_per_rule)
+              if any(hit.startswith(p) for p in prefixes)]
+        for hit in all_prefixes
+    }
+
+    # 按首字符分组写成 "\\(?=(begin\{figure\}|...))" 的形式：以普通字符开头的正则可以快速跳过无关文本，
+    # 只消耗首字符，所以重叠的前缀位置也都会被找到
+    tails_by_first = {}
+    for p in all_prefixes:
+        tails_by_first.setdefault(p[0], []).append(re.escape(p[1:]))
+    prefix_re = re.compile("|".join(
+        re.escape(first) + "(?=(" + "|".join(tails) + "))"
+        for first, tails in tails_by_first.items()
+    ))
+    return prefix_re, rules_for_prefix, patterns
+
+# 可以合并为一次扫描的保护规则（不含行数限制和花括号处理的规则）
+_FUSED_PRESERVE = _build_fused_scanner((
+    'display_math', 'sections', 'bibliography', 'thebibliography',
+    'lstlisting', 'algorithm', 'wraptable', 'wrapfigure', 'figure', 'table',
+    'multline', 'align', 'equation', 'minipage',
+    'misc_commands', 'layout_commands',
+))
+
+# 第六阶段中带花括号参数的反向规则，一次扫描收集匹配
+_FUSED_REVERSE = _build_fused_scanner(('caption', 'abstract_cmd', 'title', 'author'))
+
+# 过长行的句子边界（句末标点及其后的空白），以及没有句子边界时硬切的字符数
+_SENTENCE_BREAK_RE = re.compile(r'[.!?;。！？；]+\s*')
+HARD_SPLIT_CHARS = 400
+
+# 调试HTML的转义表，一次translate完成全部替换
+_HTML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\n': '<br/>'})
+
+# 掩码取值对应的填充字节
+_MASK_FILL = {PRESERVE: b"\x00", TRANSFORM: b"\x01"}
+
+def new_mask(length):
+    """
+    创建初始掩码
+    
+    输入：
+    - length: 文档长度（字符数）
+    
+    输出：
+    - mask: 全部为TRANSFORM的bytearray掩码
+    
+    这个函数用bytearray作为掩码，区间赋值直接在C层面完成，没有numpy的调用开销
+    """
+    return bytearray(_MASK_FILL[TRANSFORM]) * length
+
+def _set_mask(mask, start, end, value):
+    """
+    把掩码的[start, end)区间设为指定值
+    
+    输入：
+    - mask: bytearray或numpy掩码数组
+    - start: 区间起点
+    - end: 区间终点（不含）
+    - value: PRESERVE 或 TRANSFORM
+    
+    输出：无
+    
+    bytearray的切片赋值长度不一致时会改变数组长度，这里先按numpy的切片语义裁剪区间
+    """
+    if not isinstance(mask, bytearray):
+        mask[start:end] = value
+        return
+    end = min(end, len(mask))
+    if start >= end:
+        return
+    mask[start:end] = _MASK_FILL[value] * (end - start)
+
 def set_forbidden_text(text, mask, pattern, flags=0):
     """
     在文档中标记保护区域
@@ -83,8 +497,8 @@ def set_forbidden_text(text, mask, pattern, flags=0):
     输入：
     - text: LaTeX文档内容，如 "\\begin{equation}x=1\\end{equation}"
     - mask: 保护掩码数组，如 [1,1,0,0,0]
-    - pattern: 正则表达式模式，如 r"\\begin\{equation\}.*?\\end\{equation\}"
-    - flags: 正则表达式标志，如 re.DOTALL
+    - pattern: 正则表达式模式或已编译的Pattern，如 _PATTERNS['equation']
+    - flags: 正则表达式标志，如 re.DOTALL（传入已编译Pattern时忽略）
     
     输出：
     - text: 原始文本（字符串）
@@ -92,14 +506,60 @@ def set_forbidden_text(text, mask, pattern, flags=0):
     
     这个函数将匹配的LaTeX环境标记为保护区域，不进行翻译
     """
-    if isinstance(pattern, list):
-        pattern = "|".join(pattern)
-    pattern_compile = re.compile(pattern, flags)
+    pattern_compile = _compile(pattern, flags)
     for res in pattern_compile.finditer(text):
-        mask[res.span()[0] : res.span()[1]] = PRESERVE
+        _set_mask(mask, res.start(), res.end(), PRESERVE)
+    return text, mask
+
+def set_forbidden_text_fused(text, mask, scanner):
+    """
+    一次扫描同时应用多条保护规则
+    
+    输入：
+    - text: LaTeX文档内容
+    - mask: 保护掩码数组
+    - scanner: _build_fused_scanner 的返回值，如 _FUSED_PRESERVE
+    
+    输出：
+    - text: 原始文本（字符串）
+    - mask: 更新后的掩码数组
+    
+    这个函数的结果与对每条规则分别调用 set_forbidden_text 相同：
+    每条规则记录自己上一次匹配的结束位置，只接受不与自身重叠的匹配
+    """
+    prefix_re, rules_for_prefix, patterns = scanner
+    next_start = [0] * len(patterns)
+    for hit in prefix_re.finditer(text):
+        pos = hit.start()
+        for index in rules_for_prefix[text[pos] + hit.group(hit.lastindex)]:
+            if pos < next_start[index]:
+                continue
+            res = patterns[index].match(text, pos)
+            if res is not None:
+                _set_mask(mask, pos, res.end(), PRESERVE)
+                next_start[index] = res.end()
     return text, mask
 
-def set_forbidden_text_begin_end(text, mask, pattern, flags=0, limit_n_lines=42):
+def newline_positions(text):
+    """
+    计算文本中所有换行符的位置
+    
+    输入：
+    - text: LaTeX文档内容
+    
+    输出：
+    - nl_positions: 换行符位置的有序数组（字符下标），如 array([5, 12, 30])
+    
+    区间 [start, end) 内的换行数可以用两次 searchsorted 求出，不必重新扫描区间文本
+    """
+    try:
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    except UnicodeEncodeError:
+        # 含孤立代理字符时无法编码，退回逐个查找
+        return np.fromiter((m.start() for m in re.finditer('\n', text)), dtype=np.int64)
+    return np.flatnonzero(codes == 0x0a)
+
+def set_forbidden_text_begin_end(text, mask, pattern, flags=0, limit_n_lines=42, nl_positions=None):
     """
     标记begin-end环境保护区域（限制行数）
     
@@ -109,6 +569,7 @@ def set_forbidden_text_begin_end(text, mask, pattern, flags=0, limit_n_lines=42)
     - pattern: 正则表达式模式，如 r"\\begin\{([a-z\*]*)\}(.*?)\\end\{\1\}"
     - flags: 正则表达式标志
     - limit_n_lines: 行数限制，如42
+    - nl_positions: 换行符位置数组（由 newline_positions 生成），不传时在函数内计算
     
     输出：
     - text: 原始文本（字符串）
@@ -116,14 +577,48 @@ def set_forbidden_text_begin_end(text, mask, pattern, flags=0, limit_n_lines=42)
     
     这个函数处理begin-end环境，但限制在指定行数内的才保护
     """
-    pattern_compile = re.compile(pattern, flags)
+    if nl_positions is None:
+        nl_positions = newline_positions(text)
+    pattern_compile = _compile(pattern, flags)
     for res in pattern_compile.finditer(text):
-        matched_text = res.group()
-        line_count = matched_text.count('\n')
+        start, end = res.span()
+        line_count = np.searchsorted(nl_positions, end) - np.searchsorted(nl_positions, start)
         if line_count <= limit_n_lines:
-            mask[res.span()[0] : res.span()[1]] = PRESERVE
+            _set_mask(mask, start, end, PRESERVE)
     return text, mask
 
+def _find_closing_brace(text, p, brace_level, max_steps=1024 * 16):
+    """
+    从指定位置开始寻找使花括号层级归零的右括号
+    
+    输入：
+    - text: LaTeX文档内容
+    - p: 开始扫描的位置
+    - brace_level: 初始花括号层级，如 -1 表示还没进入命令参数
+    - max_steps: 最多扫描的字符数，默认16K
+    
+    输出：
+    - p: 匹配右括号的位置；找不到时返回扫描终点
+    
+    这个函数用str.find在花括号之间跳跃，只对括号本身做Python层面的处理
+    """
+    limit = min(p + max_steps, len(text))
+    close_pos = -1
+    while True:
+        if close_pos < p:
+            close_pos = text.find("}", p, limit)
+            if close_pos == -1:
+                return limit
+        open_pos = text.find("{", p, close_pos)
+        if open_pos != -1:
+            brace_level += 1
+            p = open_pos + 1
+            continue
+        if brace_level == 0:
+            return close_pos
+        brace_level -= 1
+        p = close_pos + 1
+
 def set_forbidden_text_careful_brace(text, mask, pattern, flags=0):
     """
     小心处理花括号的保护区域设置
@@ -140,65 +635,76 @@ def set_forbidden_text_careful_brace(text, mask, pattern, flags=0):
     
     这个函数处理复杂的花括号嵌套情况，确保LaTeX命令完整性
     """
-    pattern_compile = re.compile(pattern, flags)
+    pattern_compile = _compile(pattern, flags)
     for res in pattern_compile.finditer(text):
-        brace_level = -1
-        p = begin = end = res.regs[0][0]
-        for _ in range(1024 * 16):
-            if p >= len(text):
-                break
-            if text[p] == "}" and brace_level == 0:
-                break
-            elif text[p] == "}":
-                brace_level -= 1
-            elif text[p] == "{":
-                brace_level += 1
-            p += 1
+        begin = res.start()
+        p = _find_closing_brace(text, begin, brace_level=-1)
         end = p + 1
         if end <= len(text):
-            mask[begin:end] = PRESERVE
+            _set_mask(mask, begin, end, PRESERVE)
     return text, mask
 
-def reverse_forbidden_text_careful_brace(text, mask, pattern, flags=0, forbid_wrapper=True):
+def _reverse_brace_span(text, res):
     """
-    反向处理：将某些区域从保护状态改为可翻译状态
+    计算一次反向匹配的内容区间
     
     输入：
     - text: LaTeX文档内容
-    - mask: 保护掩码数组
-    - pattern: 正则表达式模式，如 r"\\caption\{(.*?)\}"
-    - flags: 正则表达式标志
-    - forbid_wrapper: 是否禁止包装器，如 True
+    - res: 规则的匹配结果，第1组是命令参数的开头
     
     输出：
-    - text: 原始文本（字符串）
-    - mask: 更新后的掩码数组
+    - span: (匹配起点, 匹配终点, 内容起点, 内容终点)
+    """
+    begin = res.start(1)
+    end = _find_closing_brace(text, begin, brace_level=0)
+    return res.start(), res.end(), begin, end
+
+def _apply_reverse_spans(mask, spans, text_length, forbid_wrapper=True):
+    """
+    按顺序把反向匹配的内容设为可翻译，命令外壳设为保护
     
-    这个函数将caption等内容标记为可翻译，但保护其LaTeX命令结构
+    输入：
+    - mask: 保护掩码数组
+    - spans: _reverse_brace_span 的结果列表
+    - text_length: 文档长度
+    - forbid_wrapper: 是否保护命令外壳，如 True
+    
+    输出：无
     """
-    pattern_compile = re.compile(pattern, flags)
-    for res in pattern_compile.finditer(text):
-        if len(res.regs) < 2:
-            continue
-        brace_level = 0
-        p = begin = end = res.regs[1][0]
-        for _ in range(1024 * 16):
-            if p >= len(text):
-                break
-            if text[p] == "}" and brace_level == 0:
-                break
-            elif text[p] == "}":
-                brace_level -= 1
-            elif text[p] == "{":
-                brace_level += 1
-            p += 1
-        end = p
-        if end <= len(text):
-            mask[begin:end] = TRANSFORM
+    for match_start, match_end, begin, end in spans:
+        if end <= text_length:
+            _set_mask(mask, begin, end, TRANSFORM)
             if forbid_wrapper:
-                mask[res.regs[0][0] : begin] = PRESERVE
-                mask[end : res.regs[0][1]] = PRESERVE
-    return text, mask
+                _set_mask(mask, match_start, begin, PRESERVE)
+                _set_mask(mask, end, match_end, PRESERVE)
+
+def collect_reverse_spans_fused(text, scanner):
+    """
+    一次扫描找出多条花括号反向规则的全部匹配
+    
+    输入：
+    - text: LaTeX文档内容
+    - scanner: _build_fused_scanner 的返回值，如 _FUSED_REVERSE
+    
+    输出：
+    - spans_per_rule: 每条规则一个 _reverse_brace_span 结果列表，顺序与scanner中的规则一致
+    
+    每条规则的匹配与单独 finditer 的结果相同。掩码写入的先后顺序会影响结果，
+    所以这里只收集区间，由调用方按原来的规则顺序用 _apply_reverse_spans 写入
+    """
+    prefix_re, rules_for_prefix, patterns = scanner
+    spans_per_rule = [[] for _ in patterns]
+    next_start = [0] * len(patterns)
+    for hit in prefix_re.finditer(text):
+        pos = hit.start()
+        for index in rules_for_prefix[text[pos] + hit.group(hit.lastindex)]:
+            if pos < next_start[index]:
+                continue
+            res = patterns[index].match(text, pos)
+            if res is not None:
+                spans_per_rule[index].append(_reverse_brace_span(text, res))
+                next_start[index] = res.end()
+    return spans_per_rule
 
 def reverse_forbidden_text(text, mask, pattern, flags=0, forbid_wrapper=True):
     """
@@ -217,75 +723,104 @@ def reverse_forbidden_text(text, mask, pattern, flags=0, forbid_wrapper=True):
     
     这个函数处理简单的反向操作，如abstract环境
     """
-    pattern_compile = re.compile(pattern, flags)
+    pattern_compile = _compile(pattern, flags)
     for res in pattern_compile.finditer(text):
-        if len(res.regs) >= 2:
+        if pattern_compile.groups >= 1:
             # 内容部分设为可翻译
-            mask[res.regs[1][0] : res.regs[1][1]] = TRANSFORM
+            _set_mask(mask, res.start(1), res.end(1), TRANSFORM)
             if forbid_wrapper:
                 # 命令部分保护
-                mask[res.regs[0][0] : res.regs[1][0]] = PRESERVE
-                mask[res.regs[1][1] : res.regs[0][1]] = PRESERVE
+                _set_mask(mask, res.start(), res.start(1), PRESERVE)
+                _set_mask(mask, res.end(1), res.end(), PRESERVE)
         else:
             # 整体设为可翻译
-            mask[res.span()[0] : res.span()[1]] = TRANSFORM
+            _set_mask(mask, res.start(), res.end(), TRANSFORM)
     return text, mask
 
-def convert_to_linklist(text, mask):
+class Segments(NamedTuple):
     """
-    将文本和掩码转换为链表结构
+    文档片段的并列数组表示
+    
+    第i个片段是 text[starts[i]:ends[i]]，preserve[i] 表示是否保护。
+    片段字符串只在最终提取时才切出来，不需要为每个片段创建节点对象
+    """
+    starts: np.ndarray
+    ends: np.ndarray
+    preserve: np.ndarray
+
+def convert_to_segments(text, mask):
+    """
+    将文本和掩码转换为并列数组形式的片段
     
     输入：
     - text: LaTeX文档内容，如 "\\section{Title}Content here"
     - mask: 保护掩码数组，如 [0,0,0,1,1,1]
     
     输出：
-    - root: 链表根节点
+    - segments: Segments(starts, ends, preserve)
     
-    这个函数将文档转换为链表，方便管理保护区域和翻译区域
+    第一个片段总是保护片段（生成调试HTML时对应链表根节点），文档以翻译区域开头时它是一个空片段
     """
-    root = LinkedListNode("", preserve=True)
-    current_node = root
-    for c, m, i in zip(text, mask, range(len(text))):
-        if (m == PRESERVE and current_node.preserve) or (
-            m == TRANSFORM and not current_node.preserve
-        ):
-            # 添加到当前节点
-            current_node.string += c
-        else:
-            # 创建新节点
-            current_node.next = LinkedListNode(c, preserve=(m == PRESERVE))
-            current_node = current_node.next
-    return root
+    mask_arr = np.asarray(mask, dtype=np.uint8)
+    boundaries = np.flatnonzero(mask_arr[1:] != mask_arr[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)).astype(np.int64)
+    ends = np.concatenate((boundaries, [len(text)])).astype(np.int64)
+    preserve = mask_arr[starts] == PRESERVE if len(text) else np.ones(1, dtype=np.bool_)
+    if not preserve[0]:
+        # 开头是翻译区域时，前面补一个空的保护片段
+        starts = np.concatenate(([0], starts))
+        ends = np.concatenate(([0], ends))
+        preserve = np.concatenate(([True], preserve))
+    return Segments(starts, ends, preserve)
 
-def post_process(root):
+def post_process_segments(text, segments, min_length=42):
     """
-    后处理链表，优化节点结构
+    后处理片段，屏蔽过短片段并合并相邻的保护片段
     
     输入：
-    - root: 链表根节点
+    - text: LaTeX文档内容
+    - segments: convert_to_segments 的结果
+    - min_length: 翻译片段去掉首尾空白后的最短长度，默认42
     
     输出：
-    - root: 处理后的链表根节点
-    
-    这个函数合并相邻的同类型节点，过滤过短的片段
-    """
-    # 屏蔽空行和太短的句子
-    node = root
-    while node is not None:
-        if len(node.string.strip()) < 42:  # 过短的片段标记为保护
-            node.preserve = True
-        node = node.next
-    
-    # 合并相邻的保护节点
-    node = root
-    while node is not None:
-        if node.next and node.preserve and node.next.preserve:
-            node.string += node.next.string
-            node.next = node.next.next
-        else:
-            node = node.next
+    - segments: 处理后的 Segments
+    
+    这个函数的长度判断和合并都用数组运算完成，只有长度够但首尾是空白的片段才需要实际strip一次
+    """
+    starts, ends, preserve = segments
+    lengths = ends - starts
+    short = lengths < min_length
+    for i in np.flatnonzero(~short & ~preserve).tolist():
+        start, end = int(starts[i]), int(ends[i])
+        if text[start].isspace() or text[end - 1].isspace():
+            short[i] = len(text[start:end].strip()) < min_length
+    preserve = preserve | short
+
+    # 每一组连续的保护片段合并为一个，组的起点是"自己或前一个不是保护片段"的位置
+    group_starts = np.concatenate(([0], np.flatnonzero(~(preserve[1:] & preserve[:-1])) + 1))
+    group_ends = np.concatenate((group_starts[1:] - 1, [len(starts) - 1]))
+    return Segments(starts[group_starts], ends[group_ends], preserve[group_starts])
+
+def segments_to_linklist(text, segments):
+    """
+    把片段转换回链表，仅供生成调试HTML使用
+    
+    输入：
+    - text: LaTeX文档内容
+    - segments: Segments
     
+    输出：
+    - root: 链表根节点
+    """
+    root = None
+    current_node = None
+    for start, end, preserve in zip(segments.starts.tolist(), segments.ends.tolist(), segments.preserve.tolist()):
+        node = LinkedListNode(text[start:end], preserve=preserve)
+        if root is None:
+            root = node
+        else:
+            current_node.next = node
+        current_node = node
     return root
 
 class LaTeXContentSplitter:
@@ -299,18 +834,20 @@ class LaTeXContentSplitter:
     4. 支持反向操作和特殊处理
     """
     
-    def __init__(self, max_token_limit: int = 800):
+    def __init__(self, max_token_limit: int = 800, debug_html: bool = False):
         """
         初始化切分器
         
         输入：
         - max_token_limit: 每段的最大token限制，默认800
+        - debug_html: 是否在工作目录生成调试HTML文件，默认False
         
         输出：无
         
         这个函数初始化切分器，设置分割参数和保护规则
         """
         self.max_token_limit = max_token_limit
+        self.debug_html = debug_html
         
         logger.info(f"LaTeX内容切分器初始化完成")
         logger.info(f"最大token限制: {self.max_token_limit}")
@@ -332,172 +869,49 @@ class LaTeXContentSplitter:
         try:
             logger.info("开始LaTeX完整保护切分...")
             
-            # 创建保护掩码
-            mask = np.zeros(len(text), dtype=np.uint8) + TRANSFORM
-            
-            # === 第一阶段：基础保护设置 ===
-            logger.info("第一阶段：基础保护设置")
-            
-            # 吸收title与作者以上的部分
-            text, mask = set_forbidden_text(text, mask, r"^(.*?)\\maketitle", re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, r"^(.*?)\\begin{document}", re.DOTALL)
-            
-            # 吸收iffalse注释
-            text, mask = set_forbidden_text(text, mask, r"\\iffalse(.*?)\\fi", re.DOTALL)
+            # 第一至六阶段：计算保护掩码（相同文档直接复用缓存）
+            mask = self._get_protection_mask(text)
             
-            # === 第二阶段：环境保护 ===
-            logger.info("第二阶段：环境保护")
-            
-            # 吸收在42行以内的begin-end组合
-            text, mask = set_forbidden_text_begin_end(text, mask, r"\\begin\{([a-z\*]*)\}(.*?)\\end\{\1\}", re.DOTALL, limit_n_lines=42)
-            
-            # 吸收匿名公式
-            text, mask = set_forbidden_text(text, mask, [r"\$\$([^$]+)\$\$", r"\\\[.*?\\\]"], re.DOTALL)
-            
-            # === 第三阶段：章节和命令保护 ===
-            logger.info("第三阶段：章节和命令保护")
-            
-            # 吸收章节标题
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\section\{(.*?)\}", 
-                r"\\section\*\{(.*?)\}", 
-                r"\\subsection\{(.*?)\}", 
-                r"\\subsubsection\{(.*?)\}"
-            ])
-            
-            # 吸收参考文献相关
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\bibliography\{(.*?)\}", 
-                r"\\bibliographystyle\{(.*?)\}"
-            ])
-            text, mask = set_forbidden_text(text, mask, r"\\begin\{thebibliography\}.*?\\end\{thebibliography\}", re.DOTALL)
-            
-            # === 第四阶段：特殊环境保护 ===
-            logger.info("第四阶段：特殊环境保护")
-            
-            # 代码和算法环境
-            text, mask = set_forbidden_text(text, mask, r"\\begin\{lstlisting\}(.*?)\\end\{lstlisting\}", re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, r"\\begin\{algorithm\}(.*?)\\end\{algorithm\}", re.DOTALL)
-            
-            # 表格和图片环境
-            text, mask = set_forbidden_text(text, mask, r"\\begin\{wraptable\}(.*?)\\end\{wraptable\}", re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{wrapfigure\}(.*?)\\end\{wrapfigure\}", 
-                r"\\begin\{wrapfigure\*\}(.*?)\\end\{wrapfigure\*\}"
-            ], re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{figure\}(.*?)\\end\{figure\}", 
-                r"\\begin\{figure\*\}(.*?)\\end\{figure\*\}"
-            ], re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{table\}(.*?)\\end\{table\}", 
-                r"\\begin\{table\*\}(.*?)\\end\{table\*\}"
-            ], re.DOTALL)
-            
-            # 数学环境
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{multline\}(.*?)\\end\{multline\}", 
-                r"\\begin\{multline\*\}(.*?)\\end\{multline\*\}"
-            ], re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{align\*\}(.*?)\\end\{align\*\}", 
-                r"\\begin\{align\}(.*?)\\end\{align\}"
-            ], re.DOTALL)
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{equation\}(.*?)\\end\{equation\}", 
-                r"\\begin\{equation\*\}(.*?)\\end\{equation\*\}"
-            ], re.DOTALL)
-            
-            # minipage环境
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\begin\{minipage\}(.*?)\\end\{minipage\}", 
-                r"\\begin\{minipage\*\}(.*?)\\end\{minipage\*\}"
-            ], re.DOTALL)
-            
-            # === 第五阶段：杂项命令保护 ===
-            logger.info("第五阶段：杂项命令保护")
-            
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\includepdf\[(.*?)\]\{(.*?)\}", 
-                r"\\clearpage", 
-                r"\\newpage", 
-                r"\\appendix", 
-                r"\\tableofcontents", 
-                r"\\include\{(.*?)\}"
-            ])
-            text, mask = set_forbidden_text(text, mask, [
-                r"\\vspace\{(.*?)\}", 
-                r"\\hspace\{(.*?)\}", 
-                r"\\label\{(.*?)\}", 
-                r"\\begin\{(.*?)\}", 
-                r"\\end\{(.*?)\}", 
-                r"\\item "
-            ])
-            
-            # 小心处理花括号命令
-            text, mask = set_forbidden_text_careful_brace(text, mask, r"\\hl\{(.*?)\}", re.DOTALL)
-            
-            # === 第六阶段：反向操作（最重要！） ===
-            logger.info("第六阶段：反向操作处理")
-            
-            # reverse 操作必须放在最后
-            # 先处理caption - 使用更宽松的匹配
-            text, mask = reverse_forbidden_text_careful_brace(text, mask, r"\\caption\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL, forbid_wrapper=True)
-            
-            # 处理abstract环境 - 分别处理两种格式
-            text, mask = reverse_forbidden_text_careful_brace(text, mask, r"\\abstract\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL, forbid_wrapper=True)
-            text, mask = reverse_forbidden_text(text, mask, r"\\begin\{abstract\}(.*?)\\end\{abstract\}", re.DOTALL, forbid_wrapper=True)
-            
-            # 添加更多可翻译内容
-            text, mask = reverse_forbidden_text_careful_brace(text, mask, r"\\title\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL, forbid_wrapper=True)
-            text, mask = reverse_forbidden_text_careful_brace(text, mask, r"\\author\{([^}]*(?:\{[^}]*\}[^}]*)*)\}", re.DOTALL, forbid_wrapper=True)
-
-            # === 第七阶段：转换为链表结构 ===
-            logger.info("第七阶段：转换为链表结构")
+            # === 第七阶段：划分片段 ===
+            logger.info("第七阶段：划分片段")
             
-            root = convert_to_linklist(text, mask)
-            root = post_process(root)
+            # 片段只记录起止位置，字符串到提取时才切出来
+            doc_segments = convert_to_segments(text, np.frombuffer(mask, dtype=np.uint8))
+            doc_segments = post_process_segments(text, doc_segments)
             
             # === 第八阶段：提取翻译段落 ===
             logger.info("第八阶段：提取翻译段落")
             
             segments = []
             structure_info = []
-            nodes = []
             
-            node = root
             segment_index = 0
             
-            # 生成调试HTML文件
-            if project_folder:
-                self._write_debug_html(root, project_folder)
+            # 生成调试HTML文件（文件通常比原文还大，只在调试时生成）
+            if project_folder and self.debug_html:
+                self._write_debug_html(segments_to_linklist(text, doc_segments), project_folder)
             
-            while node is not None:
-                nodes.append(node)
-                
-                if node.preserve:
+            for start, end, preserve in zip(doc_segments.starts.tolist(),
+                                            doc_segments.ends.tolist(),
+                                            doc_segments.preserve.tolist()):
+                content = text[start:end]
+                if preserve:
                     # 保护区域，记录但不翻译
                     structure_info.append({
                         'type': 'preserve',
-                        'content': node.string,
+                        'content': content,
                         'index': -1  # 表示不需要翻译
                     })
                 else:
                     # 需要翻译的区域
-                    if node.string.strip():  # 跳过空白内容
-                        segments.append(node.string)
+                    if content.strip():  # 跳过空白内容
+                        segments.append(content)
                         structure_info.append({
                             'type': 'translate',
-                            'content': node.string,
+                            'content': content,
                             'index': segment_index  # 在segments列表中的索引
                         })
                         segment_index += 1
-                
-                node = node.next
-            
-            # 清理节点引用，避免内存问题
-            for n in nodes:
-                n.next = None
             
             logger.info(f"完整保护切分完成，提取 {len(segments)} 个可翻译片段")
             logger.info(f"完整结构包含 {len(structure_info)} 个部分")
@@ -537,6 +951,97 @@ class LaTeXContentSplitter:
             # 回退到简单切分
             return self._simple_split_by_token(text), []
     
+    def _get_protection_mask(self, text: str) -> bytes:
+        """
+        获取文档的保护掩码，优先使用缓存
+        
+        输入：
+        - text: 完整的LaTeX文档内容
+        
+        输出：
+        - mask: 保护掩码（bytes，每个字符一个字节，PRESERVE或TRANSFORM）
+        
+        这个函数按文档内容的哈希缓存第一至六阶段的结果，同一文档再次切分时跳过全部正则扫描
+        """
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        with _MASK_CACHE_LOCK:
+            mask = _MASK_CACHE.get(key)
+            if mask is not None:
+                _MASK_CACHE.move_to_end(key)
+        if mask is not None:
+            logger.info("命中保护掩码缓存，跳过第一至六阶段")
+            return mask
+        
+        mask = self._compute_protection_mask(text)
+        with _MASK_CACHE_LOCK:
+            _MASK_CACHE[key] = mask
+            while len(_MASK_CACHE) > MASK_CACHE_SIZE:
+                _MASK_CACHE.popitem(last=False)
+        return mask
+    
+    def _compute_protection_mask(self, text: str) -> bytes:
+        """
+        依次应用全部保护规则，计算保护掩码
+        
+        输入：
+        - text: 完整的LaTeX文档内容
+        
+        输出：
+        - mask: 保护掩码（bytes）
+        
+        这个函数包含切分的第一至六阶段，规则顺序与原版gpt_academic一致
+        """
+        # 创建保护掩码，并预先算出换行符位置供行数统计使用
+        mask = new_mask(len(text))
+        nl_positions = newline_positions(text)
+        
+        # === 第一阶段：基础保护设置 ===
+        logger.info("第一阶段：基础保护设置")
+        
+        # 吸收title与作者以上的部分
+        text, mask = set_forbidden_text(text, mask, _PATTERNS['before_maketitle'])
+        text, mask = set_forbidden_text(text, mask, _PATTERNS['before_document'])
+        
+        # 吸收iffalse注释
+        text, mask = set_forbidden_text(text, mask, _PATTERNS['iffalse'])
+        
+        # === 第二阶段：环境保护 ===
+        logger.info("第二阶段：环境保护")
+        
+        # 吸收在42行以内的begin-end组合
+        text, mask = set_forbidden_text_begin_end(text, mask, _PATTERNS['begin_end'], limit_n_lines=42,
+                                                  nl_positions=nl_positions)
+        
+        # === 第三至五阶段：公式、章节、特殊环境和杂项命令保护 ===
+        logger.info("第三至五阶段：公式、章节、特殊环境和杂项命令保护（合并扫描）")
+        
+        # 匿名公式、章节标题、参考文献、代码/算法/图表/数学/minipage环境以及杂项命令
+        # 结果与逐条调用 set_forbidden_text 完全一致，但只扫描一遍全文
+        text, mask = set_forbidden_text_fused(text, mask, _FUSED_PRESERVE)
+        
+        # 小心处理花括号命令
+        text, mask = set_forbidden_text_careful_brace(text, mask, _PATTERNS['hl'])
+        
+        # === 第六阶段：反向操作（最重要！） ===
+        logger.info("第六阶段：反向操作处理")
+        
+        # reverse 操作必须放在最后
+        # caption/abstract/title/author 一次扫描收集，写入掩码时仍保持原来的先后顺序
+        caption_spans, abstract_spans, title_spans, author_spans = collect_reverse_spans_fused(text, _FUSED_REVERSE)
+        
+        # 先处理caption - 使用更宽松的匹配
+        _apply_reverse_spans(mask, caption_spans, len(text), forbid_wrapper=True)
+        
+        # 处理abstract环境 - 分别处理两种格式
+        _apply_reverse_spans(mask, abstract_spans, len(text), forbid_wrapper=True)
+        text, mask = reverse_forbidden_text(text, mask, _PATTERNS['abstract_env'], forbid_wrapper=True)
+        
+        # 添加更多可翻译内容
+        _apply_reverse_spans(mask, title_spans, len(text), forbid_wrapper=True)
+        _apply_reverse_spans(mask, author_spans, len(text), forbid_wrapper=True)
+        
+        return bytes(mask)
+    
     def _write_debug_html(self, root, project_folder: str):
         """
         生成调试HTML文件
@@ -567,7 +1072,7 @@ class LaTeXContentSplitter:
                 preserve_count = 0
                 
                 while node is not None:
-                    show_html = node.string.replace('\n', '<br/>').replace('<', '&lt;').replace('>', '&gt;')
+                    show_html = node.string.translate(_HTML_ESCAPE_TABLE)
                     
                     if not node.preserve:
                         segment_count += 1
@@ -613,8 +1118,15 @@ class LaTeXContentSplitter:
         current_segment = []
         current_tokens = 0
         
-        for line in lines:
-            line_tokens = get_token_num(line)
+        for line, line_tokens in zip(lines, _line_token_counts(segment)):
+            if line_tokens > self.max_token_limit:
+                # 单独一行就超过限制，按句子拆开，不再整行作为一个片段
+                if current_segment:
+                    sub_segments.append('\n'.join(current_segment))
+                current_segment = []
+                current_tokens = 0
+                sub_segments.extend(self._split_long_line(line))
+                continue
             
             if current_tokens + line_tokens > self.max_token_limit * 0.8:
                 if current_segment:
@@ -630,6 +1142,68 @@ class LaTeXContentSplitter:
         
         return sub_segments
     
+    def _split_long_line(self, line: str) -> List[str]:
+        """
+        切分单独一行就超过token限制的文本
+        
+        输入：
+        - line: 过长的一行文本，如很长的摘要段落
+        
+        输出：
+        - pieces: 切分后的片段列表，直接拼接即可还原原行
+        
+        这个函数先按句子边界切开再按token预算重新组合；单个句子仍然过长时按固定字符数硬切
+        """
+        budget = self.max_token_limit * 0.8
+        offsets = [0] + [m.end() for m in _SENTENCE_BREAK_RE.finditer(line) if m.end() < len(line)] + [len(line)]
+        
+        pieces = []
+        piece_start = piece_end = 0
+        piece_tokens = 0
+        for start, end, tokens in zip(offsets[:-1], offsets[1:], _range_token_counts(line, offsets)):
+            if tokens > budget:
+                # 单个句子就超出预算
+                if piece_end > piece_start:
+                    pieces.append(line[piece_start:piece_end])
+                pieces.extend(self._hard_split(line[start:end], budget))
+                piece_start = piece_end = end
+                piece_tokens = 0
+            elif piece_end > piece_start and piece_tokens + tokens > budget:
+                pieces.append(line[piece_start:piece_end])
+                piece_start, piece_end = start, end
+                piece_tokens = tokens
+            else:
+                piece_end = end
+                piece_tokens += tokens
+        
+        if piece_end > piece_start:
+            pieces.append(line[piece_start:piece_end])
+        return pieces
+    
+    def _hard_split(self, text: str, budget: float) -> List[str]:
+        """
+        按固定字符数硬切没有句子边界的长文本
+        
+        输入：
+        - text: 过长的文本
+        - budget: 每段的token预算
+        
+        输出：
+        - pieces: 切分后的片段列表，直接拼接即可还原原文
+        
+        这个函数先每HARD_SPLIT_CHARS个字符切一段，仍然超出预算的再对半切开
+        """
+        pending = [text[i:i + HARD_SPLIT_CHARS] for i in range(0, len(text), HARD_SPLIT_CHARS)]
+        pieces = []
+        while pending:
+            piece = pending.pop(0)
+            if len(piece) > 1 and get_token_num(piece) > budget:
+                middle = len(piece) // 2
+                pending[:0] = [piece[:middle], piece[middle:]]
+            else:
+                pieces.append(piece)
+        return pieces
+    
     def _simple_split_by_token(self, content: str) -> List[str]:
         """
         简单的按token限制切分（备用方案）
@@ -649,8 +1223,7 @@ class LaTeXContentSplitter:
         current_segment = []
         current_token_count = 0
         
-        for line in lines:
-            line_token_count = get_token_num(line)
+        for line, line_token_count in zip(lines, _line_token_counts(content)):
             
             if current_token_count + line_token_count > self.max_token_limit:
                 if current_segment:
@@ -695,7 +1268,57 @@ class LaTeXContentSplitter:
             logger.error(f"内容切分失败: {e}")
             return [content], []
 
-def split_latex_content(content: str, max_token_limit: int = 800, project_folder: str = "./work") -> Tuple[bool, List[str]]:
+def _print_split_stats(segments: List[str], structure_info: List[dict], max_token_limit: int):
+    """
+    打印切分统计信息
+    
+    输入：
+    - segments: 切分后的内容列表
+    - structure_info: 文档结构信息
+    - max_token_limit: 每段的最大token限制
+    
+    输出：无
+    
+    这个函数一次遍历同时统计长度和token数量
+    """
+    print(f"切分完成统计:")
+    print(f"- 段落数量: {len(segments)}")
+    if segments:
+        total_length = 0
+        min_length = float('inf')
+        max_length = 0
+        max_tokens = 0
+        for s in segments:
+            length = len(s)
+            total_length += length
+            min_length = min(min_length, length)
+            max_length = max(max_length, length)
+            max_tokens = max(max_tokens, get_token_num(s))
+        
+        print(f"- 平均长度: {total_length / len(segments):.0f} 字符")
+        print(f"- 最短段落: {min_length} 字符")
+        print(f"- 最长段落: {max_length} 字符")
+        
+        # 验证token数量
+        print(f"- 最大token数: {max_tokens}")
+        if max_tokens > max_token_limit:
+            print(f"⚠️  警告：仍有片段超过token限制({max_tokens} > {max_token_limit})")
+        else:
+            print(f"✅ 所有片段都在token限制内")
+    
+    # 打印结构信息统计
+    if structure_info:
+        preserve_count = 0
+        translate_count = 0
+        for item in structure_info:
+            if item['type'] == 'preserve':
+                preserve_count += 1
+            elif item['type'] == 'translate':
+                translate_count += 1
+        print(f"- 结构统计: 保护区域 {preserve_count} 个, 翻译区域 {translate_count} 个")
+
+def split_latex_content(content: str, max_token_limit: int = 800, project_folder: str = "./work",
+                        debug_html: bool = False, verbose: bool = True) -> Tuple[bool, List[str]]:
     """
     便捷函数：切分LaTeX内容（完整版）
     
@@ -703,6 +1326,8 @@ def split_latex_content(content: str, max_token_limit: int = 800, project_folder
     - content: LaTeX文档内容
     - max_token_limit: 每段的最大token限制，默认800
     - project_folder: 工作目录，用于保存调试文件
+    - debug_html: 是否生成调试HTML文件，默认False
+    - verbose: 是否打印切分统计，默认True；关闭时不再为统计重新扫描各段落
     
     输出：
     - success: 是否成功（布尔值）
@@ -710,31 +1335,12 @@ def split_latex_content(content: str, max_token_limit: int = 800, project_folder
     
     这个函数提供最简单的调用方式，一步完成LaTeX内容的智能切分
     """
-    splitter = LaTeXContentSplitter(max_token_limit=max_token_limit)
+    splitter = LaTeXContentSplitter(max_token_limit=max_token_limit, debug_html=debug_html)
     try:
         segments, structure_info = splitter.split_content(content, project_folder)
         
-        # 打印切分统计
-        print(f"切分完成统计:")
-        print(f"- 段落数量: {len(segments)}")
-        if segments:
-            print(f"- 平均长度: {sum(len(s) for s in segments) / len(segments):.0f} 字符")
-            print(f"- 最短段落: {min(len(s) for s in segments)} 字符")
-            print(f"- 最长段落: {max(len(s) for s in segments)} 字符")
-            
-            # 验证token数量
-            max_tokens = max(get_token_num(s) for s in segments)
-            print(f"- 最大token数: {max_tokens}")
-            if max_tokens > max_token_limit:
-                print(f"⚠️  警告：仍有片段超过token限制({max_tokens} > {max_token_limit})")
-            else:
-                print(f"✅ 所有片段都在token限制内")
-        
-        # 打印结构信息统计
-        if structure_info:
-            preserve_count = sum(1 for item in structure_info if item['type'] == 'preserve')
-            translate_count = sum(1 for item in structure_info if item['type'] == 'translate')
-            print(f"- 结构统计: 保护区域 {preserve_count} 个, 翻译区域 {translate_count} 个")
+        if verbose:
+            _print_split_stats(segments, structure_info, max_token_limit)
         
         return True, segments
     except Exception as e:
@@ -868,7 +1474,7 @@ Devlin, J., et al. (2018). BERT: Pre-training of Deep Bidirectional Transformers
 """
     
     # 创建切分器
-    splitter = LaTeXContentSplitter(max_token_limit=200)  # 使用较小限制进行测试
+    splitter = LaTeXContentSplitter(max_token_limit=200, debug_html=True)  # 使用较小限制进行测试
     
     # 创建工作目录
     work_dir = "./test_work"
@@ -876,7 +1482,7 @@ Devlin, J., et al. (2018). BERT: Pre-training of Deep Bidirectional Transformers
     
     # 测试完整保护切分
     print("\n测试: 完整保护切分")
-    success, segments = split_latex_content(test_content, max_token_limit=200, project_folder=work_dir)
+    success, segments = split_latex_content(test_content, max_token_limit=200, project_folder=work_dir, debug_html=True)
     
     if success:
         print(f"✅ 切分成功，共 {len(segments)} 个段落")
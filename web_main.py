@@ -623,8 +623,7 @@ def translate_arxiv_task_sync(
         status.set_progress(5)
         
         # 解析arxiv ID
-        downloader = ArxivDownloader()
-        success_parse, arxiv_id, _ = downloader.parse_arxiv_input(arxiv_input)
+        success_parse, arxiv_id, _ = ArxivDownloader.parse_arxiv_input(arxiv_input)
         
         if not success_parse:
             raise ValueError("无法解析arxiv输入")